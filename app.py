@@ -1,64 +1,144 @@
 import os
 import json
-import pandas as pd
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import warnings
 warnings.filterwarnings('ignore')
 from dotenv import load_dotenv
-from langchain import LLMChain
-from flask import Flask, request, render_template,  redirect, url_for,  jsonify
-from langchain_core.output_parsers import JsonOutputParser
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-import google.generativeai as genai
+from flask import Flask, Response, request, render_template,  redirect, url_for,  jsonify, stream_with_context, send_from_directory
+from markupsafe import Markup
+from cache import cache_from_env, make_cache_key
+from chains import ChainRegistry
+from datastore import data_store_from_env
+from sessions import session_store_from_env
+from retrieval import retriever_from_env, estimate_tokens
+from batch import BatchRun, parse_drafts, read_results
+from exports import EXPORT_FORMATS, EXPORT_ID_PATTERN, export_queue_from_env
+from json_stream import IncrementalJSONParser, loads_tolerant, parse_questions
+from proposal_model import finalize_proposal, format_feature_outline, merge_sections, outline_features, split_feature_groups
+from tracing import start_trace, current_trace, stage, record_cache_hit, record_tokens
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, observe_request, render_metrics
+from upstream import find_upstream_busy
 
 # Load environment variables
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise EnvironmentError("GOOGLE_API_KEY not found in environment variables")
-genai.configure(api_key=GOOGLE_API_KEY)
 
 
 app = Flask(__name__)
 
-# Initialize the model
-try:
-    llm = ChatGoogleGenerativeAI(model="gemini-pro", max_output_tokens=30000,temperature=0.001)
-except Exception as e:
-    raise RuntimeError(f"Failed to initialize ChatGoogleGenerativeAI: {e}")
+# The model client is created on first use (see get_llm); assign to `llm` to use another model
+llm = None
+llm_lock = threading.Lock()
 
-def load_tags():
+def get_llm():
+    """
+    Returns the shared chat model, creating it on first use from the backend selected by
+    LLM_BACKEND (Gemini by default, see llm_backends.py) so that importing the app needs neither
+    the API key nor the model libraries. The model is wrapped with the rate limiter, retries and
+    call coalescing of upstream.py.
+
+    Returns:
+        BaseChatModel: The chat model used by every chain.
+    """
+    global llm
+    if llm is not None:
+        return llm
+    with llm_lock:
+        if llm is None:
+            from llm_backends import create_llm, guard_from_env
+            llm = guard_from_env(create_llm())
+    return llm
+
+# Render proposal pages immediately and stream the proposal into them over SSE
+PROPOSAL_STREAMING = os.getenv("PROPOSAL_STREAMING", "1").lower() not in ("0", "false", "no")
+
+# "full" always asks the LLM for clarification questions, "adaptive" only when a field is missing,
+# "speculative" additionally generates the proposal in parallel with the questions
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "adaptive").lower()
+speculative_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SPECULATIVE_WORKERS", "4")))
+
+# Attach the full per-request trace to every response instead of only when asked with X-Trace
+TRACE_HEADER = os.getenv("TRACE_HEADER", "0").lower() in ("1", "true", "yes")
+
+# Response cache shared by the extraction, question and proposal stages
+response_cache = cache_from_env()
+
+# Questionnaire state between the draft and the answers, keyed by the token in the questions form
+session_store = session_store_from_env()
+
+def chain_cache_key(chain, stage, **inputs):
+    """
+    Builds the cache key for running `chain` with `inputs`, including the model name,
+    temperature and prompt template so that a change to any of them misses the cache.
+    """
+    chain_llm = getattr(chain, 'llm', None)
+    prompt = getattr(chain, 'prompt', None)
+    template = None
+    if prompt is not None and getattr(prompt, 'messages', None):
+        template = getattr(getattr(prompt.messages[0], 'prompt', None), 'template', None)
+    return make_cache_key(
+        stage,
+        inputs,
+        model=getattr(chain_llm, 'model', None),
+        temperature=getattr(chain_llm, 'temperature', None),
+        template=template,
+    )
+
+def cache_requested():
+    """
+    Returns False when the current request opts out of the response cache, either with a
+    `Cache-Control: no-cache` header or a truthy `no_cache` field in the JSON body or form.
+    """
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        return False
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict) and data.get('no_cache'):
+        return False
+    return request.form.get('no_cache', '').lower() not in ('1', 'true', 'yes', 'on')
+
+def load_tags(tags_file_path='tags-database.txt'):
     """
     Loads tags from a file named 'tags-database.txt' and returns them as a comma-separated string.
 
     Parameters:
-    None
+    tags_file_path (str): Path of the tags file.
 
     Returns:
     str: A comma-separated string of tags.
     """
     try:
-        with open('tags-database.txt', 'r') as file:
+        with open(tags_file_path, 'r') as file:
             tags = file.read().splitlines()
             if not tags:
-                raise ValueError("The tags-database.txt file is empty")
+                raise ValueError(f"The {tags_file_path} file is empty")
             return ', '.join(tags)
     except FileNotFoundError:
-        raise FileNotFoundError("tags-database.txt file not found")
+        raise FileNotFoundError(f"{tags_file_path} file not found")
     except Exception as e:
         raise RuntimeError(f"Error loading tags: {e}")
 
-all_tags = load_tags()
+
+def load_timeline_frame(csv_file_path):
+    """
+    Reads the timeline estimates CSV into a DataFrame, raising if it is missing or malformed.
+    """
+    import pandas as pd
+    return pd.read_csv(csv_file_path)
+
+def timeline_records(df):
+    df = df.dropna(how='all')
+    df = df.fillna('')
+    return df.to_dict('records')
 
 # Load and preprocess the CSV file
 def preprocess_csv(csv_file_path):
+    import pandas as pd
     try:
-        df = pd.read_csv(csv_file_path)
-        df = df.dropna(how='all')
-        df = df.fillna('')
-        data = df.to_dict('records')
-        json_data = json.dumps(data)
-        return json_data
+        return json.dumps(timeline_records(load_timeline_frame(csv_file_path)))
     except FileNotFoundError:
         return f"Error: The file '{csv_file_path}' was not found."
     except pd.errors.EmptyDataError:
@@ -68,23 +148,73 @@ def preprocess_csv(csv_file_path):
     except Exception as e:
         return f"An unexpected error occurred: {str(e)}"
 
-# Load the CSV file
-csv_file_path = 'timeline-estimates.csv'
-timeline_data = preprocess_csv(csv_file_path)
-
-def create_extraction_chain():
+tags_file_path = os.getenv("TAGS_FILE", 'tags-database.txt')
+csv_file_path = os.getenv("TIMELINE_CSV", 'timeline-estimates.csv')
+HOURS_PER_DAY = float(os.getenv("HOURS_PER_DAY", "8"))
+ESTIMATE_TRAFFIC_TIER = os.getenv("ESTIMATE_TRAFFIC_TIER", "easy")
+# The project category of the estimates CSV ("E-Commerce", "LMS"...) the proposal's fuzzy matches
+# are limited to; by default the category of its exactly matched sub-features
+ESTIMATE_CATEGORY = os.getenv("ESTIMATE_CATEGORY", "")
+ESTIMATE_MIN_SIMILARITY = float(os.getenv("ESTIMATE_MIN_SIMILARITY", "0.6"))
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def build_estimate_engine(frame):
+    # Hours from the estimates CSV replace the model's guesses for the sub-features it lists
+    from estimates import EstimateEngine
+    return EstimateEngine(frame, min_similarity=ESTIMATE_MIN_SIMILARITY)
+
+def build_proposal_retriever(records, all_tags):
+    # Index the timeline rows and tags so each proposal prompt only carries the relevant ones
+    if not RETRIEVAL_ENABLED:
+        return None
+    tags = [tag.strip('\ufeff ') for tag in all_tags.split(', ')]
+    return retriever_from_env(records, tags)
+
+# The data files are loaded on first access and reloaded in the background when they change
+# on disk; the CSV is parsed once per change and everything else is built from that
+data_store = data_store_from_env()
+data_store.add_file("all_tags", tags_file_path, load_tags)
+data_store.add_file("timeline_frame", csv_file_path, load_timeline_frame)
+data_store.add_derived("timeline_records", ["timeline_frame"], timeline_records)
+data_store.add_derived("timeline_data", ["timeline_records"], json.dumps)
+data_store.add_derived("estimate_engine", ["timeline_frame"], build_estimate_engine)
+data_store.add_derived("proposal_retriever", ["timeline_records", "all_tags"], build_proposal_retriever)
+
+def get_all_tags():
+    return data_store.get("all_tags")
+
+def get_timeline_data():
+    return data_store.get("timeline_data")
+
+def get_timeline_records():
+    return data_store.get("timeline_records")
+
+def get_estimate_engine():
+    return data_store.get("estimate_engine")
+
+def get_proposal_retriever():
+    return data_store.get("proposal_retriever")
+
+def select_proposal_context(all_info, **limits):
     """
-    Creates a chain for extracting specific information from user input.
+    Returns the timeline data and tags to include in the proposal prompt for `all_info`.
 
-    This function generates a prompt template for extracting details about a project, 
-    including the project description, features, competitors, timeline, and budget. 
-    It then uses this template to create an LLMChain instance, which can be used to 
-    process user input and extract the desired information.
+    When retrieval is enabled only the top-ranked timeline rows and tags within the configured
+    token budget are returned; otherwise the full data sets are used.
+
+    Parameters:
+        all_info (dict or str): The information to generate the proposal from.
+        **limits: Per-call `token_budget`, `top_k_rows` and `top_k_tags` overrides for the retriever.
 
     Returns:
-        LLMChain: A chain for extracting project information from user input.
+        tuple: The timeline data as a JSON string and the tags as a comma-separated string.
     """
-    template = """
+    proposal_retriever = get_proposal_retriever()
+    if proposal_retriever is None:
+        return get_timeline_data(), get_all_tags()
+    return proposal_retriever.select(all_info, **limits)
+
+EXTRACTION_TEMPLATE = """
     You are a project management expert and you have to extract the following information from the user's input:
     Extract the following information from the user's input. If the information is not present, output "Not provided":
 
@@ -103,11 +233,15 @@ def create_extraction_chain():
       "What are the additional features that you want to add?":"Not provided",
     }}
     """
-    prompt = ChatPromptTemplate.from_messages([HumanMessagePromptTemplate.from_template(template)])
-    return LLMChain(llm=llm, prompt=prompt)
 
-def create_question_chain():
-    template = """
+# The extraction is complete once all of these keys have a value
+EXTRACTION_KEYS = (
+    "What is the project to build?",
+    "What are the features to add in the project?",
+    "What are the additional features that you want to add?",
+)
+
+QUESTION_TEMPLATE = """
     You are a project management expert and you have to generate questions based on the extracted information.
     Based on the extracted information, generate questions for any missing or unclear details:
 
@@ -128,12 +262,8 @@ def create_question_chain():
 
     Output in JSON format without any markdown formatting.
     """
-    output_parser = JsonOutputParser()
-    prompt = ChatPromptTemplate.from_messages([HumanMessagePromptTemplate.from_template(template, output_parser=output_parser)])
-    return LLMChain(llm=llm, prompt=prompt)
 
-def create_proposal_chain():
-    template = """
+PROPOSAL_HEADER = """
     You are a project management expert and you have to create a project proposal based on the provided information.
     Create a highly detailed and comprehensive project proposal based on the following information:
     {all_info}
@@ -162,7 +292,9 @@ def create_proposal_chain():
     Select 5-10 most relevant tags from the provided list. Dont select the same tag twice and don't select tags that are not relevant to the project. For each tag, briefly explain its relevance to the project.
     Available Tags: {all_tags}
 
-    5. Major Features and Sub-Features:
+"""
+
+MARKDOWN_FEATURES_SECTION = """    5. Major Features and Sub-Features:
 
     Provide a comprehensive breakdown of at least 10-12 key features features for the project, representing the user's journey through the application. Apart from the features provided by the user including both common and advanced features relevant to the user's requirements.
     Present the information in a structured format as shown below.
@@ -213,48 +345,277 @@ def create_proposal_chain():
     Total Estimated Timeline: [Sum of all hours(show the timeline in days/weeks/months)] INR (average employee works for 8 hours a day)
     Don't provide any conclusion. 
     """
+
+STRUCTURED_FEATURES_SECTION = """\
+    5. Major Features and Sub-Features:
+
+    Provide a comprehensive breakdown of at least 10-12 key features for the project, representing the user's journey through the application: begin with onboarding features (e.g., authentication, user profile setup) and progress through core functionalities to auxiliary and long-term engagement features.
+    Include the features provided by the user as well as advanced features that add unique value to the project, and set "recommended" to true for features the user did not ask for.
+    Provide 4-5 sub-features for each main feature and use the timeline data above as the reference for the hour estimates.
+
+    Output this section only as a JSON code block in exactly this shape, with one object per sub-feature:
+    ```json
+    {{
+      "features": [
+        {{"feature": "Product Catalog Page", "sub_feature": "Numeric pagination", "description": "Navigate through pages of products using numeric links", "complexity": "Medium", "frontend_hours": 3, "backend_hours": 4, "user_value": "High", "recommended": false}},
+        {{"feature": "Product Catalog Page", "sub_feature": "Card component", "description": "Shows products in a grid of cards", "complexity": "Low", "frontend_hours": 1.5, "backend_hours": 2, "user_value": "Medium", "recommended": false}}
+      ],
+      "database_hours": 0,
+      "cicd_hours": 0
+    }}
+    ```
+    Keep each description under 15 words; hours are plain numbers. Set "database_hours" and "cicd_hours" to the hours for database design and CI/CD setup.
+    Don't add a feature table, a timeline breakdown, totals or a conclusion; they are calculated from the JSON block.
+    """
+
+# "structured" asks for the features as JSON and computes the table and totals locally,
+# "markdown" lets the model write the table and the timeline itself
+PROPOSAL_FORMAT = os.getenv("PROPOSAL_FORMAT", "structured").lower()
+PROPOSAL_TEMPLATE = PROPOSAL_HEADER + (
+    STRUCTURED_FEATURES_SECTION if PROPOSAL_FORMAT == "structured" else MARKDOWN_FEATURES_SECTION
+)
+
+PROPOSAL_OUTLINE_TEMPLATE = """
+    You are a project management expert and you have to plan a project proposal based on the provided information:
+    {all_info}
+
+    List at least 10-12 key features for the project, representing the user's journey through the application: begin with onboarding features (e.g., authentication, user profile setup) and progress through core functionalities to auxiliary and long-term engagement features.
+    Include the features provided by the user as well as advanced features that add unique value to the project, and set "recommended" to true for features the user did not ask for.
+    Name 4-5 sub-features for each main feature.
+
+    Provide the output in JSON format without any markdown formatting, in exactly this shape:
+    {{"features": [{{"feature": "Product Catalog Page", "sub_features": ["Numeric pagination", "Card component"], "recommended": false}}], "database_hours": 0, "cicd_hours": 0}}
+    Set "database_hours" and "cicd_hours" to the hours for database design and CI/CD setup.
+"""
+
+PROPOSAL_OVERVIEW_TEMPLATE = """
+    You are a project management expert and you have to write the opening sections of a project proposal based on the provided information:
+    {all_info}
+
+    The proposal covers these main features: {feature_names}
+
+    1. Title: It should be 2-3 words of title
+    Provide a catchy and crisp title for the project that reflects its core purpose and unique value proposition.
+
+    2. Executive Summary: It should be 2-3 lines of title
+    Offer a concise yet comprehensive overview of the project, including its objectives, target audience, unique selling points, and expected outcomes.
+
+    3. Technology Stack Recommendation
+    Present a detailed analysis of the recommended technology stack. For each major component (frontend, backend, database, etc.), provide:
+    - Specific technologies/frameworks and their versions for front-end you can also specify the type of CSS we can use like tailwind or so
+    - Justification for each choice, considering factors like scalability, performance, community support, and alignment with project goals
+    - Potential alternatives and why they were not selected
+
+    4. Technology Tags
+    Select 5-10 most relevant tags from the provided list. Dont select the same tag twice and don't select tags that are not relevant to the project. For each tag, briefly explain its relevance to the project.
+    Available Tags: {all_tags}
+
+    Write only these four sections in markdown; the features and the timeline are written separately.
+"""
+
+PROPOSAL_FEATURES_TEMPLATE = """
+    You are a project management expert and you have to detail part of the feature breakdown of a project proposal based on the provided information:
+    {all_info}
+
+    Detail exactly these main features and sub-features, in this order:
+    {features}
+
+    When estimating timelines for features, use the following data as a reference. Adjust your estimates based on the complexity of the requested features and the specific project requirements:
+
+    {timeline_data}
+
+    Output only a JSON code block in exactly this shape, with one object per sub-feature:
+    ```json
+    {{
+      "features": [
+        {{"feature": "Product Catalog Page", "sub_feature": "Numeric pagination", "description": "Navigate through pages of products using numeric links", "complexity": "Medium", "frontend_hours": 3, "backend_hours": 4, "user_value": "High", "recommended": false}}
+      ]
+    }}
+    ```
+    Keep each description under 15 words; hours are plain numbers.
+"""
+
+# "single" writes the whole proposal in one generation; "parallel" generates a feature outline
+# first and then the overview and groups of features concurrently (always structured output)
+PROPOSAL_GENERATION = os.getenv("PROPOSAL_GENERATION", "single").lower()
+PROPOSAL_SECTION_GROUPS = int(os.getenv("PROPOSAL_SECTION_GROUPS", "4"))
+section_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PROPOSAL_SECTION_WORKERS", "8")))
+
+def build_extraction_chain(llm, template):
+    from langchain import LLMChain
+    from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+    prompt = ChatPromptTemplate.from_messages([HumanMessagePromptTemplate.from_template(template)])
+    return LLMChain(llm=llm, prompt=prompt)
+
+def build_json_chain(llm, template):
+    from langchain import LLMChain
+    from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
     output_parser = JsonOutputParser()
     prompt = ChatPromptTemplate.from_messages([HumanMessagePromptTemplate.from_template(template, output_parser=output_parser)])
     return LLMChain(llm=llm, prompt=prompt)
 
-def extract_information(chain, user_input):
+# A file `<chain name>.txt` in this directory replaces the built-in template of that chain. The
+# files are watched like the data files, so edits take effect without a restart.
+PROMPT_TEMPLATE_DIR = os.getenv("PROMPT_TEMPLATE_DIR", "prompt_templates")
+
+def load_template_file(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def register_chain(name, template, builder):
+    data_store.add_file(f"{name}_template", os.path.join(PROMPT_TEMPLATE_DIR, f"{name}.txt"), load_template_file)
+    chain_registry.register(name, template, builder, source=lambda: data_store.get(f"{name}_template"))
+
+# Chains are built once and rebuilt only when their template text or the model changes
+chain_registry = ChainRegistry(get_llm)
+register_chain("extraction", EXTRACTION_TEMPLATE, build_extraction_chain)
+register_chain("questions", QUESTION_TEMPLATE, build_json_chain)
+register_chain("proposal", PROPOSAL_TEMPLATE, build_json_chain)
+register_chain("proposal_outline", PROPOSAL_OUTLINE_TEMPLATE, build_extraction_chain)
+register_chain("proposal_overview", PROPOSAL_OVERVIEW_TEMPLATE, build_extraction_chain)
+register_chain("proposal_features", PROPOSAL_FEATURES_TEMPLATE, build_extraction_chain)
+
+def create_extraction_chain():
+    """
+    Returns the chain for extracting specific information from user input.
+
+    The chain is built from EXTRACTION_TEMPLATE on first use and then shared by every
+    request through the chain registry, which extracts details about a project,
+    including the project description, features, competitors, timeline, and budget.
+
+    Returns:
+        LLMChain: A chain for extracting project information from user input.
+    """
+    return chain_registry.get("extraction")
+
+def create_question_chain():
+    return chain_registry.get("questions")
+
+def create_proposal_chain():
+    return chain_registry.get("proposal")
+
+def error_response(error):
+    """
+    Returns the JSON error response for a failed API call: 503 with Retry-After when the LLM
+    provider was still rate limiting or unavailable after the retries, 500 otherwise.
+    """
+    busy = find_upstream_busy(error)
+    if busy is not None:
+        return jsonify({"error": str(error)}), 503, {"Retry-After": str(busy.retry_after)}
+    return jsonify({"error": str(error)}), 500
+
+def stream_chain(chain, inputs):
+    """
+    Runs `chain` in streaming mode and yields the text chunks as the model produces them.
+    """
+    for chunk in (chain.prompt | chain.llm).stream(inputs):
+        text = getattr(chunk, 'content', chunk)
+        if text:
+            yield text
+
+def record_chain_tokens(chain, inputs, output):
+    """
+    Reports the estimated prompt and completion tokens of a chain call to the running stage.
+    """
+    try:
+        prompt_text = chain.prompt.format(**inputs)
+    except Exception:
+        prompt_text = ""
+    record_tokens(estimate_tokens(prompt_text), estimate_tokens(output if isinstance(output, str) else json.dumps(output)))
+
+def run_json_chain(chain, expected_keys=None, **inputs):
+    """
+    Runs a chain whose output is a JSON object, parsing it while the tokens arrive and stopping
+    the generation as soon as the object is closed or every expected key is complete.
+
+    Parameters:
+        chain (object): The chain object to run.
+        expected_keys (iterable): Top-level keys that complete the result.
+        **inputs: The prompt variables.
+
+    Returns:
+        str: The LLM output up to the point where the JSON object was complete.
+    """
+    parser = IncrementalJSONParser(expected_keys)
+    for text in stream_chain(chain, inputs):
+        if parser.feed(text):
+            break
+    record_chain_tokens(chain, inputs, parser.text)
+    return parser.json_text()
+
+def parse_extraction_result(extraction_result):
+    """
+    Parses the JSON object out of the raw extraction chain output, repairing trailing commas,
+    single quotes and surrounding text where necessary.
+
+    Parameters:
+        extraction_result (str): The text returned by the extraction chain.
+
+    Returns:
+        dict: The extracted information.
+    """
+    with stage("parse"):
+        extracted_info = loads_tolerant(extraction_result)
+    if not isinstance(extracted_info, dict):
+        raise ValueError("Failed to parse JSON from extraction result")
+    return extracted_info
+
+def extract_information(chain, user_input, use_cache=True):
     """
     Extracts information from the provided user input using the given chain.
 
     Parameters:
         chain (object): The chain object used for information extraction.
         user_input (str): The user input to extract information from.
+        use_cache (bool): Whether to serve and store the result through the response cache.
 
     Returns:
         dict: A dictionary containing the extracted information.
     """
+    cache_key = chain_cache_key(chain, "extract", user_input=user_input)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            record_cache_hit("extract")
+            return cached
     try:
-        extraction_result = chain.run(user_input=user_input)
-        start_index = extraction_result.find('{')
-        end_index = extraction_result.rfind('}')
-        if start_index == -1 or end_index == -1:
-            raise ValueError("Failed to parse JSON from extraction result")
-        extraction_result = extraction_result[start_index:end_index+1]
-        return json.loads(extraction_result)
+        with stage("extract", llm=True):
+            extraction_result = run_json_chain(chain, EXTRACTION_KEYS, user_input=user_input)
+        extracted_info = parse_extraction_result(extraction_result)
+        response_cache.set(cache_key, extracted_info)
+        return extracted_info
     except json.JSONDecodeError:
         raise ValueError("Error decoding JSON from the extraction result")
     except Exception as e:
         raise RuntimeError(f"Error in extracting information: {e}")
 
-def generate_questions(chain, extracted_info):
+def generate_questions(chain, extracted_info, use_cache=True):
     """
     Generates a list of questions based on the provided extracted information.
 
     Parameters:
         chain (object): The chain object used for question generation.
         extracted_info (dict): The extracted information to generate questions from.
+        use_cache (bool): Whether to serve and store the result through the response cache.
 
     Returns:
         dict: A dictionary of questions or a string indicating no additional questions are needed.
     """
+    cache_key = chain_cache_key(chain, "questions", extracted_info=extracted_info)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            record_cache_hit("questions")
+            return cached
     try:
-        questions_json = chain.run(extracted_info=extracted_info)
+        with stage("questions", llm=True):
+            questions_json = run_json_chain(chain, extracted_info=extracted_info)
         questions_dict = questions_json
+        response_cache.set(cache_key, questions_dict)
         return questions_dict
     except json.JSONDecodeError:
         raise ValueError("Error decoding JSON from the generated questions")
@@ -262,6 +623,12 @@ def generate_questions(chain, extracted_info):
         raise RuntimeError(f"Error in generating questions: {e}")
    
 
+def is_not_provided(value):
+    """
+    Returns True for a field the extraction chain marked "Not provided", in any letter case.
+    """
+    return str(value).strip().lower() == "not provided"
+
 def generate_questions_for_missing_info(extracted_info):
     """
     Generates questions for missing information in the extracted info.
@@ -274,31 +641,291 @@ def generate_questions_for_missing_info(extracted_info):
     """
     questions = {}
     for key, value in extracted_info.items():
-        if value == "Not provided":
+        if is_not_provided(value):
             questions[key] = f"Please provide information for: {key}"
     return questions if questions else {"result": "No additional questions needed."}
 
-def generate_proposal(chain, all_info):
+def needs_clarification(extracted_info):
+    """
+    Decides locally whether the extracted information needs a clarification round, i.e. whether
+    any field was marked "Not provided" by the extraction chain.
+
+    Parameters:
+        extracted_info (dict): The extracted information.
+
+    Returns:
+        bool: True if at least one field is missing.
+    """
+    if not isinstance(extracted_info, dict):
+        return True
+    # "result" is only returned when there is nothing left to ask
+    return "result" not in generate_questions_for_missing_info(extracted_info)
+
+def proposal_inputs(chain, all_info):
+    """
+    Returns the prompt variables for a proposal and the cache key they map to.
+    """
+    if PROPOSAL_GENERATION == "parallel":
+        # The sections select their own context, so the key covers the information, the data and
+        # the section templates
+        chain_llm = getattr(chain, 'llm', None)
+        templates = "\n".join(chain_registry.template(name) for name in ("proposal_outline", "proposal_overview", "proposal_features"))
+        inputs = {"all_info": all_info}
+        return inputs, make_cache_key(
+            "proposal_parallel",
+            {**inputs, "data_version": data_store.data_version()},
+            model=getattr(chain_llm, 'model', None),
+            temperature=getattr(chain_llm, 'temperature', None),
+            template=templates,
+        )
+    # The data fingerprint keeps proposals finished against older estimates data from being served.
+    # It is read before the data, so a reload in between can only file the proposal under the
+    # outdated fingerprint, which is never looked up again.
+    data_version = data_store.data_version()
+    proposal_timeline, proposal_tags = select_proposal_context(all_info)
+    # print("Time : ",proposal_timeline)
+    inputs = {"all_info": all_info, "all_tags": proposal_tags, "timeline_data": proposal_timeline}
+    return inputs, chain_cache_key(chain, "proposal", data_version=data_version, **inputs)
+
+def estimate_proposal_hours(names):
+    """
+    Looks up the hours of the proposal's sub-features in the estimates data at the configured
+    traffic tier; the estimate tool used when completing structured proposals. Only exact and
+    close matches within the proposal's category replace the model's hours.
+    """
+    engine = get_estimate_engine()
+    category = ESTIMATE_CATEGORY or engine.infer_category(names)
+    return engine.lookup_hours(names, tier=ESTIMATE_TRAFFIC_TIER, category=category)
+
+def complete_proposal(proposal):
+    """
+    Turns the model's structured feature list into the feature table and a timeline with
+    locally computed totals. Proposals without a feature block are returned unchanged.
+    """
+    with stage("finalize"):
+        return finalize_proposal(proposal, estimate_proposal_hours, HOURS_PER_DAY)
+
+def section_query(all_info, text):
+    if isinstance(all_info, dict):
+        return {**all_info, "_section": text}
+    return f"{all_info} {text}"
+
+def section_context_limits(group_count):
+    """
+    Splits the retrieval budget of one proposal across the sections of a section-parallel one,
+    so that all calls together carry no more context than a single proposal prompt: the overview
+    gets the tags' share and each feature group an equal part of the rows' share.
+
+    Returns:
+        tuple: The retriever limits for the overview call and for each feature group call.
+    """
+    proposal_retriever = get_proposal_retriever()
+    if proposal_retriever is None:
+        return {}, {}
+    budget = proposal_retriever.token_budget
+    overview = {"token_budget": budget - int(budget * 0.75), "top_k_rows": 0}
+    group = {
+        "token_budget": int(budget * 0.75) // group_count,
+        "top_k_rows": max(1, proposal_retriever.top_k_rows // group_count),
+        "top_k_tags": 0,
+    }
+    return overview, group
+
+def proposal_sections(all_info, outline):
+    """
+    Plans the concurrent calls of a section-parallel proposal from its feature outline: one for
+    the overview sections and one per group of main features, each given only the tags or
+    timeline rows relevant to it.
+
+    Parameters:
+        all_info (dict or str): The information to generate the proposal from.
+        outline (dict): The parsed output of the outline chain.
+
+    Returns:
+        list: `(stage name, chain, inputs)` tuples, the overview first and then the feature groups
+        in outline order.
+    """
+    features = outline_features(outline)
+    if not features:
+        raise ValueError("The proposal outline has no features")
+    names = ", ".join(feature["feature"] for feature in features)
+    groups = split_feature_groups(features, PROPOSAL_SECTION_GROUPS)
+    overview_limits, group_limits = section_context_limits(len(groups))
+    _, overview_tags = select_proposal_context(section_query(all_info, names), **overview_limits)
+    calls = [("overview", chain_registry.get("proposal_overview"),
+              {"all_info": all_info, "feature_names": names, "all_tags": overview_tags})]
+    for group in groups:
+        group_outline = format_feature_outline(group)
+        group_timeline, _ = select_proposal_context(group_outline, **group_limits)
+        calls.append(("features", chain_registry.get("proposal_features"),
+                      {"all_info": all_info, "features": group_outline, "timeline_data": group_timeline}))
+    return calls
+
+def parse_section_features(output):
+    """
+    Returns the feature rows of a feature group call's output.
+    """
+    with stage("parse"):
+        data = loads_tolerant(output)
+    return data.get("features", []) if isinstance(data, dict) else []
+
+def run_section(name, chain, inputs):
+    with stage(name, llm=True):
+        if name == "overview":
+            overview = chain.run(**inputs)
+            record_chain_tokens(chain, inputs, overview)
+            return overview
+        output = run_json_chain(chain, ("features",), **inputs)
+    return parse_section_features(output)
+
+def section_results(futures, count):
+    """
+    Waits for the first `count` section futures and returns their results, raising the first
+    failure of any section as soon as it happens rather than after the sections before it.
+    """
+    pending = set(futures)
+    while not all(future.done() for future in futures[:count]):
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                raise future.exception()
+    return [future.result() for future in futures[:count]]
+
+def stream_sectioned_proposal(all_info):
+    """
+    Generates a proposal section-parallel: a feature outline first, then the overview sections and
+    every group of features concurrently, merged into the structured proposal shape.
+
+    Yields the overview as soon as it is ready and the feature block once every group is done, so
+    the wall time follows the outline plus the slowest section rather than the whole text. When a
+    section fails or the caller stops reading, the sections still queued are cancelled; calls
+    already running cannot be interrupted and their results are dropped.
+    """
+    with stage("outline", llm=True):
+        outline_text = run_json_chain(chain_registry.get("proposal_outline"), ("features", "database_hours", "cicd_hours"), all_info=all_info)
+    with stage("parse"):
+        outline = loads_tolerant(outline_text)
+    futures = [
+        section_executor.submit(contextvars.copy_context().run, run_section, *call)
+        for call in proposal_sections(all_info, outline)
+    ]
+    try:
+        overview = section_results(futures, 1)[0].strip()
+        yield overview
+        groups = section_results(futures, len(futures))[1:]
+    finally:
+        for future in futures:
+            future.cancel()
+    proposal = merge_sections(overview, groups, outline.get("database_hours"), outline.get("cicd_hours"))
+    yield proposal[len(overview):]
+
+def generate_proposal(chain, all_info, use_cache=True):
     """
     Generates a proposal using the given chain and information.
 
     Args:
         chain (object): The chain object used for generating the proposal.
         all_info (str): The information to generate the proposal from.
+        use_cache (bool): Whether to serve and store the result through the response cache.
 
     Returns:
         object: The generated proposal.
     """
-    # print("Time : ",timeline_data)
+    inputs, cache_key = proposal_inputs(chain, all_info)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            record_cache_hit("proposal")
+            return cached
     try:
-        proposal_json = chain.run(all_info=all_info, all_tags=all_tags,timeline_data=timeline_data)
-        # proposal_json = chain.run(all_info=all_info, all_tags=all_tags,timeline_data=timeline_data)
+        if PROPOSAL_GENERATION == "parallel":
+            with stage("proposal"):
+                proposal_json = "".join(stream_sectioned_proposal(all_info))
+        else:
+            with stage("proposal", llm=True):
+                proposal_json = chain.run(**inputs)
+                record_chain_tokens(chain, inputs, proposal_json)
+        proposal_json = complete_proposal(proposal_json)
+        response_cache.set(cache_key, proposal_json)
         return proposal_json
     except json.JSONDecodeError:
         raise ValueError("Error decoding JSON from the generated proposal")
     except Exception as e:
         raise RuntimeError(f"Error in generating proposal: {e}")
     
+def stream_proposal(chain, all_info, use_cache=True):
+    """
+    Generates a proposal like `generate_proposal`, but yields the text in chunks as the model
+    produces them. The complete text is stored in the response cache once the stream ends.
+
+    Args:
+        chain (object): The chain object used for generating the proposal.
+        all_info (str): The information to generate the proposal from.
+        use_cache (bool): Whether to serve and store the result through the response cache.
+
+    Yields:
+        str: Consecutive chunks of the proposal markdown.
+
+    Returns:
+        str: The completed proposal, as stored in the cache, once the stream is exhausted.
+    """
+    inputs, cache_key = proposal_inputs(chain, all_info)
+    if use_cache:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            record_cache_hit("proposal")
+            yield cached
+            return cached
+    chunks = []
+    try:
+        if PROPOSAL_GENERATION == "parallel":
+            with stage("proposal"):
+                for text in stream_sectioned_proposal(all_info):
+                    chunks.append(text)
+                    yield text
+        else:
+            with stage("proposal", llm=True):
+                for text in stream_chain(chain, inputs):
+                    chunks.append(text)
+                    yield text
+                record_chain_tokens(chain, inputs, "".join(chunks))
+    except Exception as e:
+        raise RuntimeError(f"Error in generating proposal: {e}")
+    proposal = complete_proposal("".join(chunks))
+    response_cache.set(cache_key, proposal)
+    return proposal
+
+def sse_event(event, data):
+    """
+    Formats a Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def process_draft(user_input, use_cache=True):
+    """
+    Runs a draft through the whole pipeline without user interaction: extraction, question
+    generation and a proposal from the extracted information.
+
+    Parameters:
+        user_input (str): The project draft.
+        use_cache (bool): Whether to serve and store results through the response cache.
+
+    Returns:
+        dict: The extracted information, the generated questions and the proposal.
+    """
+    extracted_info = extract_information(create_extraction_chain(), user_input, use_cache=use_cache)
+    if PIPELINE_MODE == "full" or needs_clarification(extracted_info):
+        questions = generate_questions(create_question_chain(), extracted_info, use_cache=use_cache)
+        try:
+            with stage("parse"):
+                questions = parse_questions(questions)
+        except ValueError:
+            pass
+    else:
+        questions = {"result": "No additional questions needed."}
+    proposal = generate_proposal(create_proposal_chain(), extracted_info, use_cache=use_cache)
+    return {"extracted_info": extracted_info, "questions": questions, "proposal": proposal}
+
 @app.route('/api/extract', methods=['POST'])
 def api_extract():
     '''
@@ -311,12 +938,12 @@ def api_extract():
         return jsonify({"error": "Invalid input data"}), 400
 
     user_input = data.get('user_input', '')
-    extraction_chain = create_extraction_chain()
     try:
-        extracted_info = extract_information(extraction_chain, user_input)
+        extraction_chain = create_extraction_chain()
+        extracted_info = extract_information(extraction_chain, user_input, use_cache=cache_requested())
         return jsonify(extracted_info)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/generate_questions', methods=['POST'])
 def api_generate_questions():
@@ -335,12 +962,12 @@ def api_generate_questions():
         return jsonify({"error": "Invalid input data"}), 400
 
     extracted_info = data.get('extracted_info', {})
-    question_chain = create_question_chain()
     try:
-        questions_dict = generate_questions(question_chain, extracted_info)
+        question_chain = create_question_chain()
+        questions_dict = generate_questions(question_chain, extracted_info, use_cache=cache_requested())
         return jsonify(questions_dict)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/generate_proposal', methods=['POST'])
 def api_generate_proposal():
@@ -359,13 +986,361 @@ def api_generate_proposal():
         return jsonify({"error": "Invalid input data"}), 400
 
     all_info = data.get('all_info', {})
-    proposal_chain = create_proposal_chain()
     try:
-        proposal = generate_proposal(proposal_chain, all_info)
+        proposal_chain = create_proposal_chain()
+        proposal = generate_proposal(proposal_chain, all_info, use_cache=cache_requested())
         return jsonify(proposal)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/estimate', methods=['POST'])
+def api_estimate():
+    '''
+    {
+    "features": ["Numeric pagination", "Razorpay", "Group Chat", "Two factor authentication with email"],
+    "tier": "medium",
+    "category": "E-Commerce"
+    }
+
+    `tier` is the peak traffic tier: "easy" (up to 10k, default), "medium" (10k-50k) or "high" (>50k).
+    '''
+    data = request.json
+    if not data or not isinstance(data.get('features'), list):
+        return jsonify({"error": "Invalid input data"}), 400
+
+    from estimates import tier_column
+    tier = data.get('tier', ESTIMATE_TRAFFIC_TIER)
+    try:
+        tier_column(tier)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        estimates = get_estimate_engine().estimate([str(name) for name in data['features']], tier=tier, category=data.get('category'))
+        matched = estimates[estimates['matched']]
+        return jsonify({
+            "tier": tier,
+            "estimates": json.loads(estimates.to_json(orient='records')),
+            "totals": {
+                "matched": int(len(matched)),
+                "unmatched": int(len(estimates) - len(matched)),
+                "frontend_hours": float(matched['frontend_hours'].sum()),
+                "backend_hours": float(matched['backend_hours'].sum()),
+                "total_hours": float(matched['total_hours'].sum()),
+            },
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """
+    Returns the hit/miss counters of the response cache.
+    """
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Returns request and stage latency histograms, token counts, LLM calls, retries and cache hits
+    in the Prometheus text format.
+    """
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/generate_proposal/stream', methods=['POST'])
+def api_generate_proposal_stream():
+    '''
+    Streams the proposal as Server-Sent Events. Takes the same body as /api/generate_proposal,
+    plus an optional "session": the questionnaire session token, which keeps the finished proposal
+    in that session like the non-streaming form does.
+
+    Events:
+        chunk: {"text": "..."} for every piece of markdown produced by the model
+        done:  {"text": final markdown, "time_to_first_chunk": seconds, "total_time": seconds,
+                "export_id": id of the queued HTML/PDF export, see /api/export}
+        error: {"error": "..."}
+    '''
+    data = request.json
+    if not data or 'all_info' not in data:
+        return jsonify({"error": "Invalid input data"}), 400
+
+    all_info = data.get('all_info', {})
+    session_token = data.get('session')
+    use_cache = cache_requested()
+    try:
+        proposal_chain = create_proposal_chain()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    def events():
+        started = time.perf_counter()
+        time_to_first_chunk = None
+        # Flush the headers and a first byte straight away, before the model answers
+        yield ": stream opened\n\n"
+        stream = stream_proposal(proposal_chain, all_info, use_cache=use_cache)
+        try:
+            while True:
+                try:
+                    text = next(stream)
+                except StopIteration as done:
+                    # The completed proposal is the generator's return value
+                    proposal = done.value
+                    break
+                if time_to_first_chunk is None:
+                    time_to_first_chunk = time.perf_counter() - started
+                yield sse_event("chunk", {"text": text})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        total_time = time.perf_counter() - started
+        app.logger.info("Streamed proposal: first chunk after %.3fs, done after %.3fs", time_to_first_chunk or total_time, total_time)
+        if session_token:
+            save_session_proposal(session_token, all_info, proposal)
+        yield sse_event("done", {
+            "text": proposal,
+            "time_to_first_chunk": time_to_first_chunk,
+            "total_time": total_time,
+            "export_id": export_queue.submit(proposal),
+        })
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+# Batch runs are keyed by a hash of their drafts, so resubmitting the same file resumes it
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "batch_jobs")
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+# Shared by all runs, so concurrent runs together process at most BATCH_MAX_CONCURRENCY drafts
+batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENCY)
+BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "100"))
+# Finished runs kept in memory for their summaries; older ones answer from their output file only
+BATCH_KEEP_FINISHED = int(os.getenv("BATCH_KEEP_FINISHED", "32"))
+batch_runs = {}
+batch_runs_lock = threading.Lock()
+
+def evict_finished_batch_runs():
+    """
+    Drops the oldest finished runs beyond BATCH_KEEP_FINISHED. Call with `batch_runs_lock` held.
+    """
+    finished = [job_id for job_id, run in batch_runs.items() if run.finished]
+    for job_id in finished[:max(0, len(finished) - BATCH_KEEP_FINISHED)]:
+        del batch_runs[job_id]
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    '''
+    Starts a batch run in the background. Accepts a JSONL file uploaded as the `drafts` form field
+    or a JSONL request body, one {"id": "...", "user_input": "..."} object per line. Optional query
+    parameters: `concurrency` (capped at BATCH_MAX_CONCURRENCY) and `no_cache`.
+
+    Returns 202 with the job id; poll GET /api/batch/<job_id> for progress and read the results
+    from GET /api/batch/<job_id>/results.
+    '''
+    upload = request.files.get('drafts')
+    content = upload.read() if upload else request.get_data()
+    try:
+        drafts = parse_drafts(content.decode('utf-8').splitlines())
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({"error": f"Invalid input data: {e}"}), 400
+    if not drafts:
+        return jsonify({"error": "Invalid input data"}), 400
+
+    concurrency = max(1, min(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), BATCH_MAX_CONCURRENCY))
+    use_cache = cache_requested() and request.args.get('no_cache', '').lower() not in ('1', 'true', 'yes')
+    job_id = hashlib.sha256(content).hexdigest()[:16]
+    with batch_runs_lock:
+        run = batch_runs.get(job_id)
+        if run is None or run.finished:
+            batch_runs.pop(job_id, None)
+            evict_finished_batch_runs()
+            run = BatchRun(
+                drafts,
+                os.path.join(BATCH_OUTPUT_DIR, f"{job_id}.jsonl"),
+                lambda draft: process_draft(draft['user_input'], use_cache=use_cache),
+                concurrency=concurrency,
+                slots=batch_slots,
+            )
+            batch_runs[job_id] = run
+            threading.Thread(target=run.run, daemon=True).start()
+    return jsonify({
+        "job_id": job_id,
+        "total": run.total,
+        "status_url": url_for('api_batch_status', job_id=job_id),
+        "results_url": url_for('api_batch_results', job_id=job_id),
+    }), 202
+
+@app.route('/api/batch/<job_id>', methods=['GET'])
+def api_batch_status(job_id):
+    '''
+    Returns the progress counters of a batch run; the results are served by
+    GET /api/batch/<job_id>/results.
+    '''
+    output_path = os.path.join(BATCH_OUTPUT_DIR, f"{job_id}.jsonl")
+    run = batch_runs.get(job_id)
+    if run is None and not os.path.exists(output_path):
+        return jsonify({"error": "Unknown batch job"}), 404
+    status = run.summary() if run else {"finished": True}
+    return jsonify({"job_id": job_id, **status, "results_url": url_for('api_batch_results', job_id=job_id)})
+
+@app.route('/api/batch/<job_id>/results', methods=['GET'])
+def api_batch_results(job_id):
+    '''
+    Returns one page of the results written so far, in the order they finished. Query parameters:
+    `offset` (default 0) and `limit` (default and maximum BATCH_PAGE_SIZE). `next_offset` is
+    null after the last result written so far.
+    '''
+    output_path = os.path.join(BATCH_OUTPUT_DIR, f"{job_id}.jsonl")
+    if job_id not in batch_runs and not os.path.exists(output_path):
+        return jsonify({"error": "Unknown batch job"}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', BATCH_PAGE_SIZE, type=int), BATCH_PAGE_SIZE))
+    results, next_offset = read_results(output_path, offset, limit)
+    return jsonify({"job_id": job_id, "offset": offset, "next_offset": next_offset, "results": results})
+
+def export_page(title, body):
+    return app.jinja_env.get_template('proposal_export.html').render(title=title, body=Markup(body))
+
+# Static HTML and PDF exports of finished proposals, rendered in the background and kept by content hash
+export_queue = export_queue_from_env(html_page=export_page)
+# Larger proposals sent to /api/export are rejected; generated ones are a few kilobytes
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_BYTES", "100000"))
+
+def export_status(export_id):
+    """
+    Returns the JSON response describing an export and its download URLs.
+    """
+    status, error = export_queue.status(export_id)
+    if status is None:
+        return jsonify({"error": "Unknown export"}), 404
+    payload = {
+        "id": export_id,
+        "status": status,
+        **{fmt: url_for('download_export', export_id=export_id, fmt=fmt) for fmt in EXPORT_FORMATS},
+    }
+    if error:
+        payload["error"] = error
+    return jsonify(payload), 200 if status == "done" else 500 if status == "failed" else 202
+
+@app.route('/api/export', methods=['POST'])
+def api_export():
+    '''
+    Queues the HTML and PDF export of a finished proposal and returns straight away; 200 when it
+    was already rendered, 202 otherwise, and 413 for proposals over EXPORT_MAX_BYTES.
+    {
+    "proposal": "## 1. Title\nMediCart Hub\n..."
+    }
+    '''
+    data = request.json
+    proposal = data.get('proposal') if isinstance(data, dict) else None
+    if not isinstance(proposal, str) or not proposal.strip():
+        return jsonify({"error": "Invalid input data"}), 400
+    if len(proposal.encode('utf-8')) > EXPORT_MAX_BYTES:
+        return jsonify({"error": f"The proposal is larger than {EXPORT_MAX_BYTES} bytes"}), 413
+    try:
+        export_id = export_queue.submit(complete_proposal(proposal))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return export_status(export_id)
+
+@app.route('/api/export/<export_id>', methods=['GET'])
+def api_export_status(export_id):
+    '''
+    Returns the status of an export: "pending", "done" or "failed".
+    '''
+    return export_status(export_id)
+
+@app.route('/exports/<export_id>.<any(html, pdf):fmt>', methods=['GET'])
+def download_export(export_id, fmt):
+    '''
+    Serves a rendered export. The files are named by content hash and never change, so they are
+    cacheable indefinitely. Exports still rendering answer 202 with Retry-After.
+    '''
+    if not EXPORT_ID_PATTERN.match(export_id):
+        return jsonify({"error": "Unknown export"}), 404
+    status, _ = export_queue.status(export_id)
+    if status != "done":
+        response, code = export_status(export_id)
+        if code == 202:
+            response.headers['Retry-After'] = '1'
+        return response, code
+    export_queue.touch(export_id)
+    return send_from_directory(
+        os.path.abspath(export_queue.directory),
+        f"{export_id}.{fmt}",
+        mimetype=EXPORT_FORMATS[fmt],
+        as_attachment=fmt == "pdf",
+        download_name=f"proposal-{export_id[:12]}.{fmt}",
+        max_age=365 * 24 * 3600,
+    )
+
+def render_page(template_name, **context):
+    """
+    Renders a template, timed as the "render" stage of the request.
+    """
+    with stage("render"):
+        return render_template(template_name, **context)
+
+def render_proposal_page(chain, all_info, use_cache=True, session_token=None):
+    """
+    Renders 'proposal.html' for `all_info`. In streaming mode the page is returned straight away
+    and fetches the proposal from the SSE endpoint; otherwise the proposal is generated first.
+    Either way the finished proposal is kept in the questionnaire session `session_token`, if any.
+    """
+    if PROPOSAL_STREAMING:
+        return render_page('proposal.html', all_info=all_info, no_cache=not use_cache, session=session_token)
+    proposal = generate_proposal(chain, all_info, use_cache=use_cache)
+    if session_token:
+        save_session_proposal(session_token, all_info, proposal)
+    return render_finished_proposal(proposal)
+
+def render_finished_proposal(proposal):
+    """
+    Renders 'proposal.html' for a finished proposal and queues its HTML and PDF export, which the
+    page links to.
+    """
+    return render_page('proposal.html', proposal=proposal, export_id=export_queue.submit(proposal))
+
+@app.before_request
+def begin_request_trace():
+    start_trace()
+
+def trace_header_requested():
+    """
+    Whether to attach the full request trace as an `X-Pipeline-Trace` header, either for every
+    request (TRACE_HEADER=1) or when the client sends `X-Trace: 1`.
+    """
+    return TRACE_HEADER or request.headers.get('X-Trace', '').lower() in ('1', 'true', 'yes')
+
+def trace_header(trace):
+    summary = trace.summary()
+    summary["total"] = round(summary["total"] * 1000, 1)
+    for entry in summary["stages"]:
+        entry["duration"] = round(entry["duration"] * 1000, 1)
+    return json.dumps(summary, separators=(',', ':'))
+
+@app.after_request
+def add_timing_headers(response):
+    """
+    Exposes the per-stage timings of the request as a `Server-Timing` header and the number of
+    LLM round-trips it made as `X-LLM-Calls`, and records the request duration in the metrics
+    once the response (including a streamed body) has been sent.
+    """
+    trace = current_trace()
+    if trace is None:
+        return response
+    if trace.stages:
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers['X-LLM-Calls'] = str(trace.llm_calls)
+    if trace_header_requested():
+        # Durations in milliseconds; stages of a streamed body finish after the headers are sent
+        response.headers['X-Pipeline-Trace'] = trace_header(trace)
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    method, status = request.method, response.status_code
+    response.call_on_close(lambda: observe_request(route, method, status, time.perf_counter() - trace.started))
+    return response
+
 # Flask routes
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -385,44 +1360,86 @@ def index():
     try:
         if request.method == 'POST':
             user_input = request.form['user_input']
+            use_cache = cache_requested()
             extraction_chain = create_extraction_chain()
-            extracted_info = extract_information(extraction_chain, user_input)
+            extracted_info = extract_information(extraction_chain, user_input, use_cache=use_cache)
             # print("Extracted : ", extracted_info) # Uncomment to find the extracted info from the user's draft
-            question_chain = create_question_chain()
-            # questions_dict = generate_questions(question_chain, extracted_info)
-            questions_dict = json.loads(generate_questions(question_chain, extracted_info))
+            proposal_chain = create_proposal_chain()
+            speculative_proposal = None
+            if PIPELINE_MODE != "full" and not needs_clarification(extracted_info):
+                # Nothing is missing, so the question chain would only confirm that
+                questions_dict = {"result": "No additional questions needed."}
+            else:
+                if PIPELINE_MODE == "speculative":
+                    # Start the proposal now; it is used if the questions turn out to be unnecessary
+                    # and otherwise only warms the response cache
+                    speculative_proposal = speculative_executor.submit(
+                        contextvars.copy_context().run, generate_proposal, proposal_chain, extracted_info, use_cache
+                    )
+                question_chain = create_question_chain()
+                # questions_dict = generate_questions(question_chain, extracted_info)
+                questions_json = generate_questions(question_chain, extracted_info, use_cache=use_cache)
+                with stage("parse"):
+                    questions_dict = parse_questions(questions_json)
 
             # print("Question : ", questions_dict) # Check the questionaaire created by the llm for incomplete data
             
             if "result" in questions_dict and questions_dict["result"] == "No additional questions needed.":
-                proposal_chain = create_proposal_chain()
-                proposal = generate_proposal(proposal_chain, extracted_info)
-                return render_template('proposal.html', proposal=proposal)
+                if speculative_proposal is not None:
+                    return render_finished_proposal(speculative_proposal.result())
+                return render_proposal_page(proposal_chain, extracted_info, use_cache=use_cache)
             else:
-                return render_template('questions.html', questions_dict=questions_dict, extracted_info=extracted_info)
-        return render_template('index.html')
+                session_token = session_store.create(
+                    user_input=user_input, extracted_info=extracted_info, questions=questions_dict, use_cache=use_cache
+                )
+                if speculative_proposal is not None:
+                    speculative_proposal.add_done_callback(
+                        lambda future: save_proposal_draft(session_token, extracted_info, future)
+                    )
+                return render_page('questions.html', questions_dict=questions_dict, session_token=session_token)
+        return render_page('index.html')
     except Exception as e:
             error_message = "Oops, something went wrong. Please try rephrasing your input or providing more information."
-            return render_template('index.html', error_message=error_message)
+            return render_page('index.html', error_message=error_message)
+
+def save_proposal_draft(session_token, all_info, future):
+    """
+    Keeps a finished speculative proposal in the questionnaire session, so the answers step can
+    use it when the answers leave the information unchanged.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    save_session_proposal(session_token, all_info, future.result())
 
-def generate_questionnaire(input_dict):
+def save_session_proposal(session_token, all_info, proposal):
+    """
+    Keeps a finished proposal for `all_info` in the questionnaire session, so submitting the same
+    answers again returns it without another generation. Expired sessions are left alone.
+    """
+    session_store.update(session_token, proposal={"all_info": all_info, "proposal": proposal})
+
+def generate_questionnaire(input_dict, extracted_info=None):
     """
     Generate a questionnaire based on the provided input dictionary.
 
     Args:
-        input_dict (dict): A dictionary containing the user input and extracted information.
+        input_dict (dict): A dictionary containing the user's answers.
+        extracted_info (dict): The extracted information from the questionnaire session. When omitted
+            it is read from the 'extracted_info' field of `input_dict`.
 
     Returns:
         tuple: A tuple containing two elements:
             - questionnaire (list): A list of questions and their corresponding answers.
             - extracted_info (dict): The updated extracted information dictionary.
 
-    This function parses the 'extracted_info' string from the input dictionary into a dictionary. It then iterates over each key-value pair in the extracted_info dictionary. If the value is "Not provided", it checks if there is a corresponding answer in the main input_dict. If there is, it substitutes the "Not provided" with the answer and appends the question and answer to the questionnaire list. If there is no answer, it keeps it as a question and appends it to the questionnaire list. Finally, it returns the questionnaire list and the updated extracted_info dictionary.
+    When no `extracted_info` is given, this function parses the 'extracted_info' string from the input dictionary into a dictionary, accepting both JSON and the Python representation rendered into the hidden form field of older pages. It then iterates over each key-value pair in the extracted_info dictionary. If the value is "Not provided", it checks if there is a corresponding answer in the main input_dict. If there is, it substitutes the "Not provided" with the answer and appends the question and answer to the questionnaire list. If there is no answer, it keeps it as a question and appends it to the questionnaire list. Finally, it returns the questionnaire list and the updated extracted_info dictionary.
     """
-    extracted_info = json.loads(input_dict['extracted_info'].replace("'", '"'))
+    if extracted_info is None:
+        extracted_info = loads_tolerant(input_dict['extracted_info'])
+    extracted_info = dict(extracted_info)
     questionnaire = []
     for key, value in extracted_info.items():
-        if value == "Not provided":
+        if is_not_provided(value):
             if key in input_dict:
                 extracted_info[key] = input_dict[key]
                 questionnaire.append(f"Q: {key}\nA: {input_dict[key]}")
@@ -436,8 +1453,9 @@ def submit_answers():
     Handles the submission of answers from the user.
 
     This function is triggered when the user submits their answers to the questionnaire.
-    It extracts the answers from the form, generates a proposal based on the answers,
-    and returns the proposal as an HTML template.
+    It looks up the questionnaire session from the form's token, merges the answers into the
+    extracted information, generates a proposal based on it, and returns the proposal as an HTML
+    template. A proposal already generated in the session for the same information is reused.
 
     Parameters:
         None
@@ -446,14 +1464,57 @@ def submit_answers():
         render_template: The proposal HTML template with the generated proposal.
     """
     answers = request.form.to_dict()
+    session_token = answers.pop('session', None)
     try:
-        _, extracted_info = generate_questionnaire(answers)
+        if session_token is None:
+            # Questionnaire pages rendered before the session store carry the extracted info themselves
+            _, extracted_info = generate_questionnaire(answers)
+            proposal_chain = create_proposal_chain()
+            return render_proposal_page(proposal_chain, extracted_info, use_cache=cache_requested())
+
+        session = session_store.get(session_token)
+        if session is None:
+            return render_page('index.html', error_message="This questionnaire has expired. Please submit your draft again.")
+        _, extracted_info = generate_questionnaire(answers, session['extracted_info'])
+        use_cache = session.get('use_cache', True) and cache_requested()
+        draft = session.get('proposal')
+        if use_cache and draft and draft['all_info'] == extracted_info:
+            return render_finished_proposal(draft['proposal'])
         proposal_chain = create_proposal_chain()
-        proposal = generate_proposal(proposal_chain, extracted_info)
-        return render_template('proposal.html', proposal=proposal)
+        return render_proposal_page(proposal_chain, extracted_info, use_cache=use_cache, session_token=session_token)
     except Exception as e:
         error_message = f"Error generating proposal: {str(e)}"
-        return render_template('index.html', error_message=error_message)
+        return render_page('index.html', error_message=error_message)
+
+def preload():
+    """
+    Loads the data files, builds the estimate engine and retrieval index, and creates the model
+    client and chains, so the first request does not pay for them.
+    """
+    get_all_tags()
+    get_timeline_records()
+    get_estimate_engine()
+    get_proposal_retriever()
+    for name in ("extraction", "questions", "proposal"):
+        chain_registry.get(name)
+
+def create_app(preload_resources=None):
+    """
+    App factory for WSGI servers, e.g. `gunicorn "app:create_app()"` or `flask --app app:create_app run`.
+
+    Parameters:
+        preload_resources (bool): Load data and the model client before serving. Defaults to the
+            PRELOAD_ON_START environment variable; otherwise everything is loaded on first use.
+
+    Returns:
+        Flask: The application.
+    """
+    if preload_resources is None:
+        preload_resources = os.getenv("PRELOAD_ON_START", "0").lower() in ("1", "true", "yes")
+    if preload_resources:
+        preload()
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    create_app().run(debug=True)
\ No newline at end of file
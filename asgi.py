@@ -0,0 +1,353 @@
+"""
+Async serving path for the proposal generator.
+
+The JSON API routes (/api/extract, /api/generate_questions, /api/generate_proposal) are served
+natively on the event loop and call the chains' async API, so a request waiting on Gemini does not
+hold a worker thread. Every other route is delegated to the Flask app.
+
+Upstream LLM calls are capped by a global semaphore, requests beyond the concurrency limit wait in
+a bounded queue, and once the queue is full new requests are rejected with 429 and Retry-After.
+Each stage has its own timeout. When the LLM provider is still rate limiting after the retries of
+upstream.py, the request fails with 503 and Retry-After.
+
+Blocking work (response cache lookups in SQLite, retrieval over the estimates data and completing
+proposals) runs in worker threads, and the data and model client are loaded at lifespan startup,
+so none of it stalls the event loop.
+
+Run with:
+    uvicorn asgi:application --workers 1
+"""
+import os
+import json
+import time
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as proposal_app
+from json_stream import IncrementalJSONParser, loads_tolerant
+from proposal_model import merge_sections
+from metrics import observe_request
+from tracing import start_trace, stage, record_cache_hit
+from upstream import find_upstream_busy
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+ASYNC_MAX_QUEUE = int(os.getenv("ASYNC_MAX_QUEUE", "64"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+STAGE_TIMEOUTS = {
+    "extract": float(os.getenv("EXTRACT_TIMEOUT", "30")),
+    "questions": float(os.getenv("QUESTIONS_TIMEOUT", "30")),
+    "proposal": float(os.getenv("PROPOSAL_TIMEOUT", "180")),
+}
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the number of admitted requests has reached the queue limit.
+    """
+
+
+class StageTimeoutError(Exception):
+    """
+    Raised when a pipeline stage exceeds its timeout.
+    """
+
+
+class AdmissionControl:
+    """
+    Bounds the work the async path accepts.
+
+    At most `max_concurrency` upstream LLM calls run at once; up to `max_queue` further requests
+    may wait for a slot. Anything beyond that is rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_concurrency, max_queue):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    @property
+    def upstream(self):
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def admit(self):
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise QueueFullError("Too many requests in flight")
+        self.admitted += 1
+
+    def release(self):
+        self.admitted -= 1
+
+
+admission = AdmissionControl(LLM_MAX_CONCURRENCY, ASYNC_MAX_QUEUE)
+
+
+async def cache_get(cache_key, name):
+    """
+    Looks `cache_key` up in the response cache from a worker thread, recording a hit for `name`.
+    """
+    cached = await asyncio.to_thread(proposal_app.response_cache.get, cache_key)
+    if cached is not None:
+        record_cache_hit(name)
+    return cached
+
+
+async def cache_set(cache_key, value):
+    await asyncio.to_thread(proposal_app.response_cache.set, cache_key, value)
+
+
+async def stream_json(chain, expected_keys, inputs):
+    """
+    Async counterpart of `run_json_chain`: streams the chain and stops as soon as the JSON
+    object is complete.
+    """
+    parser = IncrementalJSONParser(expected_keys)
+    async for chunk in (chain.prompt | chain.llm).astream(inputs):
+        text = getattr(chunk, 'content', chunk)
+        if text and parser.feed(text):
+            break
+    proposal_app.record_chain_tokens(chain, inputs, parser.text)
+    return parser.json_text()
+
+
+async def call_chain(stage, chain, json_output=False, expected_keys=None, **inputs):
+    """
+    Runs `chain` asynchronously under the upstream semaphore and the stage's timeout.
+
+    The timeout covers the time spent waiting for a semaphore slot as well as the LLM call.
+    """
+    async def run():
+        async with admission.upstream:
+            if json_output:
+                return await stream_json(chain, expected_keys, inputs)
+            output = await chain.arun(**inputs)
+            proposal_app.record_chain_tokens(chain, inputs, output)
+            return output
+
+    try:
+        return await asyncio.wait_for(run(), timeout=STAGE_TIMEOUTS[stage])
+    except asyncio.TimeoutError:
+        raise StageTimeoutError(f"The {stage} stage timed out after {STAGE_TIMEOUTS[stage]:g}s")
+
+
+async def aextract_information(chain, user_input, use_cache=True):
+    """
+    Async counterpart of `extract_information`.
+    """
+    cache_key = proposal_app.chain_cache_key(chain, "extract", user_input=user_input)
+    if use_cache:
+        cached = await cache_get(cache_key, "extract")
+        if cached is not None:
+            return cached
+    with stage("extract", llm=True):
+        extraction_result = await call_chain(
+            "extract", chain, json_output=True, expected_keys=proposal_app.EXTRACTION_KEYS, user_input=user_input
+        )
+    extracted_info = proposal_app.parse_extraction_result(extraction_result)
+    await cache_set(cache_key, extracted_info)
+    return extracted_info
+
+
+async def agenerate_questions(chain, extracted_info, use_cache=True):
+    """
+    Async counterpart of `generate_questions`.
+    """
+    cache_key = proposal_app.chain_cache_key(chain, "questions", extracted_info=extracted_info)
+    if use_cache:
+        cached = await cache_get(cache_key, "questions")
+        if cached is not None:
+            return cached
+    with stage("questions", llm=True):
+        questions_dict = await call_chain("questions", chain, json_output=True, extracted_info=extracted_info)
+    await cache_set(cache_key, questions_dict)
+    return questions_dict
+
+
+async def arun_section(name, chain, inputs):
+    with stage(name, llm=True):
+        if name == "overview":
+            return await call_chain("proposal", chain, **inputs)
+        output = await call_chain("proposal", chain, json_output=True, expected_keys=("features",), **inputs)
+    return proposal_app.parse_section_features(output)
+
+
+async def agenerate_sectioned_proposal(all_info):
+    """
+    Async counterpart of `stream_sectioned_proposal`, returning the merged proposal. Every
+    section call takes its own upstream slot and runs under the proposal timeout. The first
+    failing section cancels the others.
+    """
+    with stage("outline", llm=True):
+        outline_text = await call_chain(
+            "proposal", proposal_app.chain_registry.get("proposal_outline"), json_output=True,
+            expected_keys=("features", "database_hours", "cicd_hours"), all_info=all_info,
+        )
+    with stage("parse"):
+        outline = loads_tolerant(outline_text)
+    calls = await asyncio.to_thread(proposal_app.proposal_sections, all_info, outline)
+    tasks = [asyncio.ensure_future(arun_section(*call)) for call in calls]
+    try:
+        overview, *groups = await asyncio.gather(*tasks)
+    finally:
+        # gather leaves the other tasks running when one fails
+        for task in tasks:
+            task.cancel()
+    return merge_sections(overview.strip(), groups, outline.get("database_hours"), outline.get("cicd_hours"))
+
+
+async def agenerate_proposal(chain, all_info, use_cache=True):
+    """
+    Async counterpart of `generate_proposal`.
+    """
+    inputs, cache_key = await asyncio.to_thread(proposal_app.proposal_inputs, chain, all_info)
+    if use_cache:
+        cached = await cache_get(cache_key, "proposal")
+        if cached is not None:
+            return cached
+    if proposal_app.PROPOSAL_GENERATION == "parallel":
+        with stage("proposal"):
+            proposal = await agenerate_sectioned_proposal(all_info)
+    else:
+        with stage("proposal", llm=True):
+            proposal = await call_chain("proposal", chain, **inputs)
+    proposal = await asyncio.to_thread(proposal_app.complete_proposal, proposal)
+    await cache_set(cache_key, proposal)
+    return proposal
+
+
+async def api_extract(data, use_cache):
+    if 'user_input' not in data:
+        return 400, {"error": "Invalid input data"}
+    chain = proposal_app.create_extraction_chain()
+    return 200, await aextract_information(chain, data.get('user_input', ''), use_cache=use_cache)
+
+
+async def api_generate_questions(data, use_cache):
+    if 'extracted_info' not in data:
+        return 400, {"error": "Invalid input data"}
+    chain = proposal_app.create_question_chain()
+    return 200, await agenerate_questions(chain, data.get('extracted_info', {}), use_cache=use_cache)
+
+
+async def api_generate_proposal(data, use_cache):
+    if 'all_info' not in data:
+        return 400, {"error": "Invalid input data"}
+    chain = proposal_app.create_proposal_chain()
+    return 200, await agenerate_proposal(chain, data.get('all_info', {}), use_cache=use_cache)
+
+
+ROUTES = {
+    "/api/extract": api_extract,
+    "/api/generate_questions": api_generate_questions,
+    "/api/generate_proposal": api_generate_proposal,
+}
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def trace_headers(trace, headers):
+    """
+    The timing headers the Flask app adds in `add_timing_headers`, for the natively served routes.
+    """
+    extra = []
+    if trace.stages:
+        extra.append((b"server-timing", trace.server_timing().encode()))
+        extra.append((b"x-llm-calls", str(trace.llm_calls).encode()))
+    if proposal_app.TRACE_HEADER or headers.get(b"x-trace", b"").lower() in (b"1", b"true", b"yes"):
+        extra.append((b"x-pipeline-trace", proposal_app.trace_header(trace).encode()))
+    return extra
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def handle_api(scope, receive, send, handler):
+    trace = start_trace()
+    status = await dispatch_api(scope, receive, send, handler, trace)
+    observe_request(scope["path"], scope["method"], status, time.perf_counter() - trace.started)
+
+
+async def dispatch_api(scope, receive, send, handler, trace):
+    if scope["method"] != "POST":
+        await send_json(send, 405, {"error": "Method not allowed"})
+        return 405
+    try:
+        admission.admit()
+    except QueueFullError as e:
+        await send_json(send, 429, {"error": str(e)}, [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())])
+        return 429
+    try:
+        try:
+            data = json.loads(await read_body(receive) or b"null")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await send_json(send, 400, {"error": "Invalid input data"})
+            return 400
+        headers = dict(scope.get("headers", []))
+        use_cache = b"no-cache" not in headers.get(b"cache-control", b"") and not data.get("no_cache")
+        extra_headers = []
+        try:
+            status, payload = await handler(data, use_cache)
+        except StageTimeoutError as e:
+            status, payload = 504, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+            busy = find_upstream_busy(e)
+            if busy is not None:
+                status = 503
+                extra_headers.append((b"retry-after", str(busy.retry_after).encode()))
+        await send_json(send, status, payload, trace_headers(trace, headers) + extra_headers)
+        return status
+    finally:
+        admission.release()
+
+
+flask_application = WsgiToAsgi(proposal_app.app)
+
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point: serves the JSON API natively and hands everything else to Flask.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Load the data, retrieval index and model client before the first request; if that
+                # fails they are loaded on first use as before
+                try:
+                    await asyncio.to_thread(proposal_app.preload)
+                except Exception as e:
+                    proposal_app.app.logger.warning("Preloading at startup failed: %s", e)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "http" and scope["path"] in ROUTES:
+        return await handle_api(scope, receive, send, ROUTES[scope["path"]])
+    return await flask_application(scope, receive, send)
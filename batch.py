@@ -0,0 +1,221 @@
+"""
+Batch proposal generation over JSONL drafts.
+
+Each input line is a JSON object with a "user_input" draft and an optional "id". Every draft runs
+through extract -> questions -> proposal on a worker pool, and each result is appended to the
+output JSONL file as soon as it finishes. Drafts whose id already has a successful result in the
+output file are skipped, so an interrupted run can be restarted with the same arguments and picks
+up where it stopped.
+
+Usage:
+    python batch.py drafts.jsonl -o results.jsonl [--concurrency 4] [--no-cache]
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def draft_id(user_input):
+    """
+    Returns a stable id for a draft without one, derived from its text.
+    """
+    return hashlib.sha256(user_input.strip().encode('utf-8')).hexdigest()[:16]
+
+
+def parse_drafts(lines):
+    """
+    Parses JSONL draft lines into a list of `{"id": ..., "user_input": ...}` dictionaries.
+
+    Parameters:
+        lines (iterable): Lines of JSONL text. Blank lines are ignored.
+
+    Returns:
+        list: The drafts, in input order.
+    """
+    drafts = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Line {line_number} is not valid JSON")
+        if not isinstance(record, dict) or not str(record.get('user_input', '')).strip():
+            raise ValueError(f"Line {line_number} has no 'user_input'")
+        drafts.append({
+            "id": str(record.get('id') or draft_id(record['user_input'])),
+            "user_input": record['user_input'],
+        })
+    return drafts
+
+
+def read_drafts(path):
+    """
+    Reads drafts from a JSONL file.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return parse_drafts(file)
+
+
+def completed_ids(output_path):
+    """
+    Returns the ids that already have a successful result in `output_path`.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from a crash; the draft will be redone
+                continue
+            if isinstance(record, dict) and not record.get('error'):
+                done.add(record.get('id'))
+    return done
+
+
+class BatchRun:
+    """
+    Processes drafts on a thread pool and appends each result to a JSONL checkpoint file.
+
+    Parameters:
+        drafts (list): Drafts as returned by `parse_drafts`.
+        output_path (str): The JSONL file results are appended to.
+        process (callable): A function `process(draft)` that returns the result dictionary.
+        concurrency (int): The number of drafts processed in parallel.
+        slots (threading.Semaphore): Optional; held while a draft is processed, so that runs
+            sharing it together process no more drafts at once than it allows.
+    """
+
+    def __init__(self, drafts, output_path, process, concurrency=4, slots=None):
+        self.drafts = drafts
+        self.output_path = output_path
+        self.process = process
+        self.concurrency = max(1, concurrency)
+        self.slots = slots
+        self.total = len(drafts)
+        self.skipped = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def _run_one(self, draft):
+        if self.slots is None:
+            return self._process(draft)
+        with self.slots:
+            return self._process(draft)
+
+    def _process(self, draft):
+        started = time.perf_counter()
+        try:
+            result = self.process(draft)
+            result = {"id": draft['id'], **result}
+        except Exception as e:
+            result = {"id": draft['id'], "error": str(e)}
+        result['elapsed'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def _write(self, result):
+        with self._lock:
+            with open(self.output_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(result) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            if result.get('error'):
+                self.failed += 1
+            else:
+                self.succeeded += 1
+
+    def run(self):
+        """
+        Runs every pending draft and returns the progress summary.
+        """
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        done = completed_ids(self.output_path)
+        pending = []
+        for draft in self.drafts:
+            if draft['id'] in done:
+                self.skipped += 1
+            else:
+                done.add(draft['id'])
+                pending.append(draft)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._run_one, draft) for draft in pending]
+            for future in as_completed(futures):
+                self._write(future.result())
+        self.finished = True
+        return self.summary()
+
+    def summary(self):
+        """
+        Returns the progress counters of the run.
+        """
+        with self._lock:
+            return {
+                "total": self.total,
+                "skipped": self.skipped,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "finished": self.finished,
+                "output": self.output_path,
+            }
+
+
+def read_results(output_path, offset=0, limit=100):
+    """
+    Returns up to `limit` results from the checkpoint file, starting at result number `offset`,
+    without parsing the ones before it.
+
+    Returns:
+        tuple: The results and the offset of the next page, or None after the last result.
+    """
+    results = []
+    if not os.path.exists(output_path):
+        return results, None
+    with open(output_path, 'r', encoding='utf-8') as file:
+        lines = itertools.islice(file, offset, offset + limit + 1)
+        for number, line in enumerate(lines):
+            if number == limit:
+                return results, offset + limit
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A line still being written
+                return results, offset + number
+    return results, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("drafts", help="JSONL file with one {\"id\", \"user_input\"} object per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")))
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    args = parser.parse_args()
+
+    # Imported here so `--help` works without loading the model
+    import app
+
+    drafts = read_drafts(args.drafts)
+    run = BatchRun(
+        drafts,
+        args.output,
+        lambda draft: app.process_draft(draft['user_input'], use_cache=not args.no_cache),
+        concurrency=args.concurrency,
+    )
+    print(json.dumps(run.run()))
+
+
+if __name__ == "__main__":
+    main()
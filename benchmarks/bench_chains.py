@@ -0,0 +1,55 @@
+"""
+Microbenchmark for per-request chain construction overhead.
+
+Compares rebuilding the prompt template, LLMChain and output parser on every request (the old
+behaviour of create_*_chain) against fetching the shared chain from the chain registry. The LLM
+is replaced with a local fake model, so no network calls are made.
+
+Usage:
+    python benchmarks/bench_chains.py [--iterations 2000]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import app
+
+STAGES = [
+    ("extraction", app.EXTRACTION_TEMPLATE, app.build_extraction_chain, {"user_input": "I want a shop."}),
+    ("questions", app.QUESTION_TEMPLATE, app.build_json_chain, {"extracted_info": {"a": "Not provided"}}),
+    ("proposal", app.PROPOSAL_TEMPLATE, app.build_json_chain,
+     {"all_info": {"a": "b"}, "all_tags": app.get_all_tags(), "timeline_data": app.get_timeline_data()}),
+]
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    app.llm = FakeListChatModel(responses=["{}"])
+    print(f"{'stage':<12}{'mode':<10}{'build (us)':>14}{'build+run (us)':>18}")
+    for name, template, builder, inputs in STAGES:
+        rebuild = lambda: builder(app.llm, template)
+        registry = lambda: app.chain_registry.get(name)
+        for mode, get_chain in (("rebuild", rebuild), ("registry", registry)):
+            build_us = timed(get_chain, args.iterations)
+            run_us = timed(lambda: get_chain().run(**inputs), max(args.iterations // 10, 1))
+            print(f"{name:<12}{mode:<10}{build_us:>14.1f}{run_us:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline benchmark of the whole pipeline through the real routes.
+
+The drafts in prompts.txt are sent through the Flask app with LLM_BACKEND=fake, so every stage
+(extraction, questions, proposal, parsing, finalization, rendering) runs as in production while the
+model answers from benchmarks/recorded_responses.json with a fixed latency and token rate. The
+response cache is bypassed unless --cache is given.
+
+Two passes are made:
+- a sequential pass over the drafts under tracemalloc, reporting the peak memory allocated per
+  request and the prompt sizes per stage (from the X-Pipeline-Trace header);
+- a timed pass with --concurrency clients, reporting throughput and p50/p95/p99 latency per route.
+
+Flows (--flow):
+- form: POST / and, when questions are asked, POST /submit_answers (proposals rendered server-side)
+- api: /api/extract, /api/generate_questions and /api/generate_proposal
+- stream: /api/extract, then /api/generate_proposal/stream read to the end (the trace header is sent
+  before the proposal streams, so its prompt size and LLM call are not counted)
+
+Usage:
+    python benchmarks/bench_pipeline.py [--flow form|api|stream] [--concurrency 8] [--requests 200]
+                                        [--latency 0.05] [--tokens-per-second 0] [--mode adaptive]
+                                        [--generation single|parallel]
+                                        [--cache] [--output results.json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+SESSION_PATTERN = re.compile(r'name="session" value="([^"]+)"')
+
+
+def read_prompts(path):
+    """
+    Returns the drafts in `path`, which are separated by blank lines.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return [draft.strip() for draft in re.split(r"\n\s*\n", file.read()) if draft.strip()]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """
+    Collects per-route latencies, statuses and traces from concurrent clients.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.traces = []
+        self._lock = threading.Lock()
+
+    def add(self, route, latency, status, trace):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if trace:
+                self.traces.append(trace)
+
+
+def call(client, recorder, route, headers, **kwargs):
+    started = time.perf_counter()
+    response = client.post(route, headers=headers, **kwargs)
+    body = response.get_data(as_text=True)
+    latency = time.perf_counter() - started
+    trace = response.headers.get('X-Pipeline-Trace')
+    recorder.add(route, latency, response.status_code, json.loads(trace) if trace else None)
+    return response, body
+
+
+def run_flow(client, recorder, flow, draft, headers):
+    """
+    Sends one draft through `flow`.
+    """
+    if flow == "form":
+        _, body = call(client, recorder, '/', headers, data={'user_input': draft})
+        match = SESSION_PATTERN.search(body)
+        if match:
+            call(client, recorder, '/submit_answers', headers, data={
+                'session': match.group(1), 'What is your expected project timeline?': '15-30 days',
+            })
+        return
+    response, _ = call(client, recorder, '/api/extract', headers, json={'user_input': draft})
+    extracted_info = response.get_json(silent=True) or {"What is the project to build?": draft}
+    if flow == "api":
+        call(client, recorder, '/api/generate_questions', headers, json={'extracted_info': extracted_info})
+        call(client, recorder, '/api/generate_proposal', headers, json={'all_info': extracted_info})
+    else:
+        call(client, recorder, '/api/generate_proposal/stream', headers, json={'all_info': extracted_info})
+
+
+def memory_pass(app_module, flow, drafts, headers):
+    """
+    Runs every draft once, sequentially, and returns the peak memory allocated per flow in KiB
+    along with the recorded traces.
+    """
+    client = app_module.app.test_client()
+    recorder = Recorder()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for draft in drafts:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            run_flow(client, recorder, flow, draft, headers)
+            peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    return peaks, recorder
+
+
+def timed_pass(app_module, flow, drafts, headers, concurrency, total):
+    recorder = Recorder()
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def client_loop():
+        client = app_module.app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            run_flow(client, recorder, flow, drafts[index % len(drafts)], headers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client_loop) for _ in range(concurrency)]:
+            future.result()
+    return recorder, time.perf_counter() - started
+
+
+def prompt_sizes(traces):
+    sizes = {}
+    for trace in traces:
+        for entry in trace.get("stages", []):
+            if entry.get("llm"):
+                sizes.setdefault(entry["name"], []).append(entry["prompt_tokens"])
+    return {
+        name: {"min": min(values), "mean": round(statistics.mean(values), 1), "max": max(values), "calls": len(values)}
+        for name, values in sizes.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flow", choices=["form", "api", "stream"], default="form")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="drafts sent in the timed pass")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="fake LLM token rate (0: instant)")
+    parser.add_argument("--mode", choices=["adaptive", "full", "speculative"], default="adaptive")
+    parser.add_argument("--generation", choices=["single", "parallel"], default="single",
+                        help="whole proposal in one call or section-parallel")
+    parser.add_argument("--prompts", default=os.path.join(ROOT, "prompts.txt"))
+    parser.add_argument("--cache", action="store_true", help="allow response cache hits")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Read at import time by the app
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "PIPELINE_MODE": args.mode,
+        "PROPOSAL_GENERATION": args.generation,
+        "PROPOSAL_STREAMING": "0",
+    })
+    import app as app_module
+
+    drafts = read_prompts(args.prompts)
+    headers = {"X-Trace": "1"}
+    if not args.cache:
+        headers["Cache-Control"] = "no-cache"
+    app_module.preload()
+
+    peaks, memory_recorder = memory_pass(app_module, args.flow, drafts, headers)
+    recorder, elapsed = timed_pass(app_module, args.flow, drafts, headers, args.concurrency, args.requests)
+
+    routes = {
+        route: {
+            "requests": len(values),
+            "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+        }
+        for route, values in sorted(recorder.latencies.items())
+    }
+    traces = memory_recorder.traces + recorder.traces
+    results = {
+        "flow": args.flow,
+        "generation": args.generation,
+        "drafts": len(drafts),
+        "flows": args.requests,
+        "concurrency": args.concurrency,
+        "fake_latency": args.latency,
+        "tokens_per_second": args.tokens_per_second,
+        "elapsed": elapsed,
+        "flows_per_second": args.requests / elapsed if elapsed else 0.0,
+        "statuses": {str(status): count for status, count in recorder.statuses.items()},
+        "routes": routes,
+        "memory_kib": {"mean": statistics.mean(peaks), "p95": percentile(peaks, 95), "max": max(peaks)},
+        "prompt_tokens": prompt_sizes(traces),
+        "llm_calls_per_flow": sum(trace["llm_calls"] for trace in recorder.traces) / args.requests,
+    }
+
+    print(f"{args.flow} flow, {args.generation} proposals, {len(drafts)} drafts, {args.requests} flows at concurrency {args.concurrency}, "
+          f"fake LLM latency {args.latency:g}s, {args.tokens_per_second:g} tokens/s")
+    print(f"throughput {results['flows_per_second']:.1f} flows/s, statuses {results['statuses']}, "
+          f"{results['llm_calls_per_flow']:.2f} LLM calls per flow")
+    print(f"{'route':<34}{'requests':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+    for route, stats in routes.items():
+        print(f"{route:<34}{stats['requests']:>9}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}"
+              f"{stats['p99'] * 1000:>10.1f}")
+    memory = results["memory_kib"]
+    print(f"peak memory per flow: mean {memory['mean']:.0f} KiB, p95 {memory['p95']:.0f} KiB, max {memory['max']:.0f} KiB")
+    print(f"{'prompt tokens':<34}{'calls':>9}{'min':>10}{'mean':>10}{'max':>10}")
+    for name, stats in results["prompt_tokens"].items():
+        print(f"{name:<34}{stats['calls']:>9}{stats['min']:>10}{stats['mean']:>10}{stats['max']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
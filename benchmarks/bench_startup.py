@@ -0,0 +1,71 @@
+"""
+Startup benchmark: import time of app.py and time to the first requests.
+
+Each run starts a fresh interpreter, imports the app, then times the first request of each kind
+through the Flask test client: GET / (no data or model needed), POST /api/estimate (loads pandas
+and the estimates CSV) and POST /api/extract (imports LangChain and builds the chain; the model is
+a local fake, so no network calls are made). With --preload the app is created through
+create_app(preload_resources=True), which moves that work to startup instead.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--preload]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+timings = {"import": time.perf_counter() - started}
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+app.llm = FakeListChatModel(responses=['{"What is the project to build?": "Shop"}'])
+started = time.perf_counter()
+app.create_app(preload_resources=PRELOAD)
+timings["create_app"] = time.perf_counter() - started
+client = app.app.test_client()
+for name, call in (
+    ("first GET /", lambda: client.get("/")),
+    ("first /api/estimate", lambda: client.post("/api/estimate", json={"features": ["Razorpay"]})),
+    ("first /api/extract", lambda: client.post("/api/extract", json={"user_input": "A shop", "no_cache": True})),
+):
+    started = time.perf_counter()
+    response = call()
+    timings[name] = time.perf_counter() - started
+    assert response.status_code == 200, (name, response.status_code)
+print(json.dumps(timings))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", action="store_true", help="preload data and chains in create_app")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    # The app must import without an API key
+    env.pop("GOOGLE_API_KEY", None)
+    env["RESPONSE_CACHE_DB"] = ""
+    code = CHILD.replace("PRELOAD", str(args.preload))
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'phase':<24}{'median (ms)':>14}{'min (ms)':>12}")
+    for phase in runs[0]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<24}{statistics.median(values):>14.1f}{min(values):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
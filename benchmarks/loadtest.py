@@ -0,0 +1,140 @@
+"""
+Load-test harness for the sync (Flask) and async (ASGI) serving paths.
+
+The Gemini model is replaced by the replay model from llm_backends.py, answering after a fixed
+latency, so the numbers reflect the serving path rather than the upstream API. For each concurrency level the
+harness starts the server on a local port, runs that many concurrent clients against
+/api/extract with the response cache disabled, and reports requests/sec, latency percentiles and
+how many requests were rejected with 429.
+
+Usage:
+    python benchmarks/loadtest.py [--server asgi|flask|both] [--concurrency 10 100 500]
+                                  [--requests 1000] [--latency 0.5]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import aiohttp
+import uvicorn
+from werkzeug.serving import make_server
+
+import app
+import asgi
+from llm_backends import ReplayChatModel
+
+EXTRACTION_RESPONSE = (
+    '{"What is the project to build?": "Online pharmacy", '
+    '"What are the features to add in the project?": "Shopping cart, Secure payments", '
+    '"What are the additional features that you want to add?": "Not provided"}'
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_asgi(port):
+    # Fresh admission control so the semaphore binds to this server's event loop
+    asgi.admission = asgi.AdmissionControl(asgi.LLM_MAX_CONCURRENCY, asgi.ASYNC_MAX_QUEUE)
+    server = uvicorn.Server(uvicorn.Config(asgi.application, port=port, log_level="error", backlog=2048))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return stop
+
+
+def start_flask(port):
+    server = make_server("127.0.0.1", port, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+    return stop
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_clients(url, concurrency, total_requests):
+    latencies = []
+    statuses = {}
+    counter = iter(range(total_requests))
+
+    async def client(session):
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json={"user_input": f"draft {i}", "no_cache": True}) as response:
+                    await response.read()
+                    status = response.status
+            except aiohttp.ClientError:
+                status = "error"
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=600)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["asgi", "flask", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--requests", type=int, default=1000, help="requests per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.llm = ReplayChatModel(default_response=EXTRACTION_RESPONSE, latency=args.latency)
+    servers = ["flask", "asgi"] if args.server == "both" else [args.server]
+    print(f"fake LLM latency {args.latency:g}s, LLM_MAX_CONCURRENCY={asgi.LLM_MAX_CONCURRENCY}, "
+          f"ASYNC_MAX_QUEUE={asgi.ASYNC_MAX_QUEUE}")
+    print(f"{'server':<8}{'clients':>8}{'ok':>7}{'429':>7}{'other':>7}{'req/s':>9}{'p50 (s)':>10}{'p99 (s)':>10}")
+    for server in servers:
+        for concurrency in args.concurrency:
+            port = free_port()
+            stop = start_asgi(port) if server == "asgi" else start_flask(port)
+            try:
+                latencies, statuses, elapsed = asyncio.run(
+                    run_clients(f"http://127.0.0.1:{port}/api/extract", concurrency, args.requests)
+                )
+            finally:
+                stop()
+            ok = statuses.get(200, 0)
+            rejected = statuses.get(429, 0)
+            other = sum(statuses.values()) - ok - rejected
+            print(f"{server:<8}{concurrency:>8}{ok:>7}{rejected:>7}{other:>7}{ok / elapsed:>9.1f}"
+                  f"{percentile(latencies, 50):>10.3f}{percentile(latencies, 99):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_value(value):
+    """
+    Normalizes a prompt input so that cosmetically different submissions hash to the same key.
+
+    Strings are stripped and their internal whitespace is collapsed, dictionaries are
+    serialized with sorted keys and lists keep their order.
+
+    Parameters:
+        value (object): A prompt input (str, dict, list or any JSON-serializable value).
+
+    Returns:
+        object: The normalized value.
+    """
+    if isinstance(value, str):
+        return re.sub(r'\s+', ' ', value).strip()
+    if isinstance(value, dict):
+        return {str(key): normalize_value(val) for key, val in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    return value
+
+
+def make_cache_key(stage, inputs, model=None, temperature=None, template=None):
+    """
+    Builds a content-addressed cache key for an LLM call.
+
+    Parameters:
+        stage (str): The pipeline stage ("extract", "questions", "proposal").
+        inputs (dict): The prompt variables passed to the chain.
+        model (str): The model name.
+        temperature (float): The sampling temperature.
+        template (str): The prompt template text, so that template edits invalidate old entries.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    payload = {
+        "stage": stage,
+        "inputs": normalize_value(inputs),
+        "model": model,
+        "temperature": temperature,
+        "template": hashlib.sha256(template.encode('utf-8')).hexdigest() if template else None,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache with TTL eviction for LLM responses, optionally backed by SQLite.
+
+    The in-memory layer holds at most `max_size` entries. When `db_path` is given, entries are
+    also written to a SQLite table so that they survive restarts and can be shared between
+    worker processes; memory misses fall through to the database. Each cache uses its own
+    `table`, so several caches can share one database file.
+    """
+
+    def __init__(self, max_size=256, ttl=3600, db_path=None, table="responses"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl else float('inf')
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None when it is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._db_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value, self._expiry())
+        return value
+
+    def set(self, key, value):
+        """
+        Stores a JSON-serializable `value` under `key`.
+        """
+        expires_at = self._expiry()
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at if expires_at != float('inf') else 1e18),
+                )
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key, now):
+        if not self.db_path:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+        return json.loads(row[0])
+
+    def clear(self):
+        """
+        Drops every entry from memory and from the SQLite store.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current in-memory size.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "persistent": bool(self.db_path),
+            }
+
+
+def cache_from_env():
+    """
+    Creates the response cache from RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL and RESPONSE_CACHE_DB.
+    """
+    return ResponseCache(
+        max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+    )
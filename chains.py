@@ -0,0 +1,76 @@
+import threading
+
+
+class ChainRegistry:
+    """
+    Builds each LLM chain once and shares it across Flask worker threads.
+
+    Chains are registered with their prompt template text and a builder function that turns
+    `(llm, template)` into a chain. `get` returns the cached chain and only rebuilds it when the
+    template text or the underlying model object has changed, so templates can be hot-reloaded
+    without restarting the app: through a chain's `source` (app.py watches template files in
+    PROMPT_TEMPLATE_DIR this way) or with `update_template`.
+    """
+
+    def __init__(self, llm_provider):
+        self._llm_provider = llm_provider
+        self._templates = {}
+        self._sources = {}
+        self._builders = {}
+        self._chains = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, template, builder, source=None):
+        """
+        Registers a chain under `name`.
+
+        Parameters:
+            name (str): The registry key, e.g. "extraction".
+            template (str): The prompt template text.
+            builder (callable): A function `builder(llm, template)` that returns the chain.
+            source (callable): Optional; returns text replacing `template`, e.g. the contents of an
+                edited template file, or None to use `template`. Called on every `get`, so it must
+                be cheap.
+        """
+        with self._lock:
+            self._builders[name] = builder
+            self._templates[name] = template
+            self._sources[name] = source
+            self._chains.pop(name, None)
+
+    def update_template(self, name, template):
+        """
+        Replaces the template text of a registered chain. The chain is rebuilt on the next `get`
+        only if the text actually changed.
+        """
+        with self._lock:
+            if name not in self._builders:
+                raise KeyError(f"Unknown chain: {name}")
+            self._templates[name] = template
+
+    def template(self, name):
+        """
+        Returns the current template text of a registered chain.
+        """
+        source = self._sources.get(name)
+        return (source() if source is not None else None) or self._templates[name]
+
+    def get(self, name):
+        """
+        Returns the shared chain for `name`, building it on first use or after a template or
+        model change.
+        """
+        if name not in self._builders:
+            raise KeyError(f"Unknown chain: {name}")
+        llm = self._llm_provider()
+        template = self.template(name)
+        cached = self._chains.get(name)
+        # Unchanged templates are usually the same string object, which compares in constant time
+        if cached is not None and cached[1] is llm and cached[0] == template:
+            return cached[2]
+        with self._lock:
+            cached = self._chains.get(name)
+            if cached is None or cached[1] is not llm or cached[0] != template:
+                cached = (template, llm, self._builders[name](llm, template))
+                self._chains[name] = cached
+            return cached[2]
@@ -0,0 +1,203 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DataStore:
+    """
+    Holds the data files the app serves from and the values built from them, and reloads
+    them when the files change on disk.
+
+    Files are registered with a loader and derived values (indexes, prompt fragments) with the
+    names they are built from. Everything is built on first access. After that, `get` checks the
+    files' modification times at most every `check_interval` seconds. When one has changed, it
+    is reloaded and its dependents rebuilt in a background thread, and the new values are
+    swapped in all at once. Requests keep being served from the previous values in the meantime,
+    and a reload that fails leaves them in place.
+
+    Parameters:
+        check_interval (float): Minimum seconds between modification time checks; 0 disables watching.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self.fingerprint = ""
+        self._files = {}
+        self._derived = {}
+        self._order = []
+        self._values = {}
+        self._stamps = {}
+        self._digests = {}
+        self._lock = threading.RLock()
+        self._reloading = False
+        self._last_check = time.monotonic()
+
+    def add_file(self, name, path, loader):
+        """
+        Registers a data file; `loader(path)` returns its parsed value.
+        """
+        self._files[name] = (path, loader)
+        self._order.append(name)
+
+    def add_derived(self, name, depends_on, builder):
+        """
+        Registers a value built by `builder(*values)` from the named files or derived values,
+        which must already be registered.
+        """
+        self._derived[name] = (tuple(depends_on), builder)
+        self._order.append(name)
+
+    def get(self, name):
+        """
+        Returns the current value of `name`, loading it on first use.
+        """
+        values = self._values
+        if name not in values:
+            with self._lock:
+                values, stamps, digests = dict(self._values), dict(self._stamps), dict(self._digests)
+                self._build(name, values, stamps, digests)
+                self._publish(values, stamps, digests)
+        elif self.check_interval:
+            self._check_for_changes()
+        return values[name]
+
+    def data_version(self):
+        """
+        Returns the fingerprint of the data files' contents, loading any file not loaded yet so
+        that it always covers all of them.
+        """
+        if any(name not in self._values for name in self._files):
+            with self._lock:
+                values, stamps, digests = dict(self._values), dict(self._stamps), dict(self._digests)
+                for name in self._files:
+                    self._build(name, values, stamps, digests)
+                self._publish(values, stamps, digests)
+        elif self.check_interval:
+            self._check_for_changes()
+        return self.fingerprint
+
+    def _stamp(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _digest(self, path):
+        try:
+            with open(path, 'rb') as file:
+                return hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return ""
+
+    def _fingerprint(self, digests):
+        encoded = "|".join(f"{name}={digests[name]}" for name in self._order if name in digests)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+    def _build(self, name, values, stamps, digests):
+        # Called with the lock held; builds `name` and its missing dependencies into `values`,
+        # recording the files' stamps and digests, without publishing anything
+        if name in values:
+            return values[name]
+        if name in self._files:
+            path, loader = self._files[name]
+            stamps[name] = self._stamp(path)
+            value = loader(path)
+            digests[name] = self._digest(path)
+        elif name in self._derived:
+            depends_on, builder = self._derived[name]
+            value = builder(*(self._build(dependency, values, stamps, digests) for dependency in depends_on))
+        else:
+            raise KeyError(f"Unknown data: {name}")
+        values[name] = value
+        return value
+
+    def _publish(self, values, stamps, digests):
+        # Called with the lock held. Readers take the fingerprint before the values they build a
+        # cache key from, so the fingerprint goes last: a reader that sees the new fingerprint
+        # also sees the new values.
+        self._stamps = stamps
+        self._digests = digests
+        self._values = values
+        self.fingerprint = self._fingerprint(digests)
+
+    def changed_files(self):
+        """
+        Returns the names of the loaded files whose modification time or size has changed.
+        """
+        return [
+            name for name in self._files
+            if name in self._values and self._stamp(self._files[name][0]) != self._stamps.get(name)
+        ]
+
+    def _check_for_changes(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval or self._reloading:
+            return
+        self._last_check = now
+        changed = self.changed_files()
+        if not changed:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload_in_background, args=(changed,), daemon=True).start()
+
+    def _reload_in_background(self, names):
+        try:
+            self.reload(names)
+        finally:
+            self._reloading = False
+
+    def _dependents(self, names):
+        affected = set(names)
+        for name in self._order:
+            if name in self._derived and affected.intersection(self._derived[name][0]):
+                affected.add(name)
+        return affected
+
+    def reload(self, names=None):
+        """
+        Reloads the named files (by default those that changed on disk) and rebuilds the derived
+        values that depend on them, then swaps the new values and fingerprint in together.
+
+        Parameters:
+            names (list): File names to reload.
+
+        Returns:
+            list: The names of the values that were rebuilt.
+        """
+        with self._lock:
+            names = [name for name in (self.changed_files() if names is None else names) if name in self._files]
+            if not names:
+                return []
+            affected = self._dependents(names)
+            stamps, digests = dict(self._stamps), dict(self._digests)
+            values = {name: value for name, value in self._values.items() if name not in affected}
+            started = time.perf_counter()
+            try:
+                for name in self._order:
+                    # Only rebuild what was already loaded; the rest still loads on first use
+                    if name in affected and name in self._values:
+                        self._build(name, values, stamps, digests)
+            except Exception:
+                # Keep the new stamps so a broken file is not retried until it is edited again
+                self._stamps = {**self._stamps, **{name: self._stamp(self._files[name][0]) for name in names}}
+                logger.exception("Reloading %s failed; keeping the previous data", ", ".join(names))
+                return []
+            self._publish(values, stamps, digests)
+            rebuilt = [name for name in self._order if name in affected and name in values]
+        logger.info("Reloaded %s in %.0f ms", ", ".join(rebuilt), (time.perf_counter() - started) * 1000)
+        return rebuilt
+
+
+def data_store_from_env():
+    """
+    Creates a DataStore with the check interval from DATA_CHECK_INTERVAL (seconds, 0 disables watching).
+    """
+    return DataStore(check_interval=float(os.getenv("DATA_CHECK_INTERVAL", "2")))
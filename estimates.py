@@ -0,0 +1,197 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = {
+    "Main Feature": "feature",
+    "Add-on": "addon",
+    "Expected hours Frontend(UI)": "frontend_ui",
+    "Expected Hours Frontend (Integration)": "frontend_integration",
+    "Customization(%)": "customization",
+    "Expected hours backend(easy- peak traffic:10k))": "backend_easy",
+    "Expected hours backend(medium peak traffic-  (10k-50k))": "backend_medium",
+    "Expected hours backend(high> 50k)": "backend_high",
+    "Category": "category",
+}
+
+HOUR_COLUMNS = ["frontend_ui", "frontend_integration", "customization", "backend_easy", "backend_medium", "backend_high"]
+
+TIERS = {
+    "easy": "backend_easy", "low": "backend_easy", "10k": "backend_easy",
+    "medium": "backend_medium", "10k-50k": "backend_medium",
+    "high": "backend_high", ">50k": "backend_high", "50k+": "backend_high",
+}
+
+# Rows of this category (login, payments, notifications...) fit projects of any category
+GENERAL_CATEGORY = "general"
+
+
+def normalize_name(name):
+    """
+    Normalizes a feature name for lookups: lowercase alphanumeric words separated by single spaces.
+    """
+    return " ".join(re.findall(r"[a-z0-9]+", str(name).lower()))
+
+
+def tier_column(tier):
+    """
+    Maps a traffic tier name ("easy"/"low", "medium", "high") to its backend hours column.
+    """
+    column = TIERS.get(str(tier).strip().lower())
+    if column is None:
+        raise ValueError(f"Unknown traffic tier: {tier}. Use one of easy, medium or high")
+    return column
+
+
+class EstimateEngine:
+    """
+    Answers hour estimates for features from timeline-estimates.csv.
+
+    Continuation rows (empty "Main Feature") are attached to the feature above them, blank
+    backend tiers fall back to the next lower tier, and every row is indexed by its normalized
+    add-on name (or feature name for rows without add-ons) and category. Bulk queries are answered
+    in one vectorized pass: exact name matches through a pandas index, everything else through a
+    token-overlap similarity matrix.
+
+    Fuzzy matches have to be close: with the default threshold two names sharing one of two words
+    (e.g. "Doctor profile" and "My Profile") do not match. When a category is given, fuzzy matches
+    are also limited to rows of that category and the "General" rows.
+
+    Parameters:
+        frame (DataFrame): The raw CSV contents.
+        min_similarity (float): Minimum Jaccard similarity for a fuzzy match.
+    """
+
+    def __init__(self, frame, min_similarity=0.6):
+        self.min_similarity = min_similarity
+        df = frame.rename(columns=COLUMNS).dropna(how="all")
+        for column in COLUMNS.values():
+            if column not in df.columns:
+                df[column] = np.nan
+        df = df[list(COLUMNS.values())].copy()
+        for column in HOUR_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        df["feature"] = df["feature"].replace(r"^\s*$", np.nan, regex=True).ffill().fillna("")
+        df["addon"] = df["addon"].fillna("")
+        df["category"] = df["category"].ffill().fillna("")
+        df["name"] = df["addon"].where(df["addon"].str.strip() != "", df["feature"])
+        df["key"] = df["name"].map(normalize_name)
+        df = df[df["key"] != ""].reset_index(drop=True)
+        df["backend_medium"] = df["backend_medium"].fillna(df["backend_easy"])
+        df["backend_high"] = df["backend_high"].fillna(df["backend_medium"])
+        df[HOUR_COLUMNS] = df[HOUR_COLUMNS].fillna(0.0)
+        df["frontend_hours"] = df["frontend_ui"] + df["frontend_integration"]
+        df["category_key"] = df["category"].map(normalize_name)
+        self.frame = df
+        self.key_index = pd.Index(df["key"]).drop_duplicates()
+        self._key_rows = df.drop_duplicates("key").index.to_numpy()
+
+        self.vocabulary = {}
+        for key in df["key"]:
+            for term in key.split():
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        self.term_matrix = self._term_matrix(df["key"])
+        self.term_counts = self.term_matrix.sum(axis=1)
+
+    @classmethod
+    def from_csv(cls, csv_file_path, **kwargs):
+        """
+        Builds the engine from the estimates CSV file.
+        """
+        return cls(pd.read_csv(csv_file_path), **kwargs)
+
+    def _term_matrix(self, keys):
+        matrix = np.zeros((len(keys), len(self.vocabulary)), dtype=np.float32)
+        for row, key in enumerate(keys):
+            for term in key.split():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = 1.0
+        return matrix
+
+    def match(self, names, category=None):
+        """
+        Finds the best CSV row for each name.
+
+        Parameters:
+            names (list): Feature or sub-feature names.
+            category (str): Optional category (e.g. "E-Commerce"); fuzzy matches must be rows of
+                this category or "General" ones.
+
+        Returns:
+            tuple: Arrays of matched row positions (-1 when nothing matched) and match scores.
+        """
+        keys = pd.Series([normalize_name(name) for name in names], dtype=object)
+        positions = self.key_index.get_indexer(keys)
+        rows = np.where(positions >= 0, self._key_rows[np.maximum(positions, 0)], -1)
+        scores = np.where(positions >= 0, 1.0, 0.0)
+
+        missing = np.flatnonzero(positions < 0)
+        if len(missing) and len(self.frame):
+            query = self._term_matrix(keys.iloc[missing])
+            overlap = query @ self.term_matrix.T
+            union = query.sum(axis=1)[:, None] + self.term_counts[None, :] - overlap
+            similarity = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+            if category:
+                allowed = self.frame["category_key"].isin([normalize_name(category), GENERAL_CATEGORY]).to_numpy()
+                similarity = np.where(allowed[None, :], similarity, 0.0)
+            best = similarity.argmax(axis=1)
+            best_scores = similarity[np.arange(len(missing)), best]
+            accepted = best_scores >= self.min_similarity
+            rows[missing[accepted]] = best[accepted]
+            scores[missing] = np.minimum(best_scores, 1.0)
+        return rows, scores
+
+    def estimate(self, names, tier="easy", category=None):
+        """
+        Estimates hours for many features at one traffic tier.
+
+        Parameters:
+            names (list): Feature or sub-feature names.
+            tier (str): Peak traffic tier: "easy" (up to 10k), "medium" (10k-50k) or "high" (>50k).
+            category (str): Optional category fuzzy matches are limited to, see `match`.
+
+        Returns:
+            DataFrame: One row per name with the matched feature and add-on, category, frontend,
+            backend and total hours, customization percentage and match score. Unmatched names
+            have `matched` set to False and NaN hours.
+        """
+        backend_column = tier_column(tier)
+        rows, scores = self.match(names, category)
+        matched = rows >= 0
+        picked = self.frame.iloc[np.maximum(rows, 0)].reset_index(drop=True) if len(self.frame) else None
+        result = pd.DataFrame({"query": list(names), "matched": matched, "score": np.round(scores, 3)})
+        for column, source in (
+            ("feature", "feature"), ("addon", "addon"), ("category", "category"),
+            ("frontend_hours", "frontend_hours"), ("backend_hours", backend_column),
+            ("customization", "customization"),
+        ):
+            values = picked[source].to_numpy() if picked is not None else np.full(len(names), np.nan)
+            result[column] = np.where(matched, values, np.nan if column.endswith("hours") or column == "customization" else "")
+        result["total_hours"] = result["frontend_hours"] + result["backend_hours"]
+        result["tier"] = tier
+        return result
+
+    def infer_category(self, names):
+        """
+        Returns the category most of the names that match a row exactly belong to, leaving out
+        "General", or None when none of them does.
+        """
+        keys = pd.Series([normalize_name(name) for name in names], dtype=object)
+        positions = self.key_index.get_indexer(keys)
+        categories = self.frame["category"].iloc[self._key_rows[positions[positions >= 0]]]
+        categories = categories[categories.map(normalize_name) != GENERAL_CATEGORY]
+        return categories.mode().iloc[0] if len(categories) else None
+
+    def lookup_hours(self, names, tier="easy", category=None):
+        """
+        Returns `{"frontend_hours", "backend_hours"}` for each name, or None where nothing
+        matched closely enough. This is the form `normalize_features` expects for the proposal
+        feature list.
+        """
+        result = self.estimate(names, tier, category)
+        hours = []
+        for matched, frontend, backend in zip(result["matched"], result["frontend_hours"], result["backend_hours"]):
+            hours.append({"frontend_hours": float(frontend), "backend_hours": float(backend)} if matched else None)
+        return hours
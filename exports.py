@@ -0,0 +1,351 @@
+"""
+Static HTML and PDF exports of finished proposals.
+
+The proposal page renders the markdown in the browser with markdown-it and MathJax from a CDN on
+every view. An export renders it once on the server instead: `ExportQueue.submit` hands the
+markdown to a worker pool and returns straight away with the export id, a hash of the content,
+and the workers write `<id>.html` and `<id>.pdf` to the export directory. The same proposal always
+maps to the same files, so repeated views and exports cost nothing, and the files survive restarts
+until they expire or are evicted as the least recently used.
+
+The markdown is parsed with markdown-it-py, the Python port of the page's markdown-it, with the
+same preset, so the export shows what the page shows. Raw HTML is escaped as on the page, except
+for the `<sup>` mark of recommended features. The PDF is laid out from the same HTML by fpdf2 with
+the standard PDF fonts, so no font files are needed; characters outside WinAnsi (cp1252) become
+"?". LaTeX is left as text.
+"""
+import os
+import re
+import html
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fpdf import FPDF, FontFace
+from markdown_it import MarkdownIt
+from markdown_it.token import Token
+
+logger = logging.getLogger(__name__)
+
+# Part of the content hash, so that a change to the renderers produces new files
+RENDERER_VERSION = "3"
+
+EXPORT_FORMATS = {
+    "html": "text/html",
+    "pdf": "application/pdf",
+}
+EXPORT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+EXPORT_FILE_PATTERN = re.compile(r"^([0-9a-f]{32})\.(html|pdf)$")
+
+# window.markdownit() on the proposal page uses the "default" preset: tables, no raw HTML
+MARKDOWN = MarkdownIt("js-default")
+# The one inline HTML tag proposals use: the "recommended" mark of render_feature_table
+ESCAPED_SUP_PATTERN = re.compile(r"&lt;sup&gt;(.+?)&lt;/sup&gt;")
+TITLE_PATTERN = re.compile(r"^(?:\d+\.\s*)?title\s*(?:[:\-]\s*(.*))?$", re.IGNORECASE)
+
+PDF_TAG_STYLES = {
+    "h1": FontFace(emphasis="B", size_pt=20, color=0),
+    "h2": FontFace(emphasis="B", size_pt=16, color=0),
+    "h3": FontFace(emphasis="B", size_pt=13, color=0),
+    "h4": FontFace(emphasis="B", size_pt=11, color=0),
+}
+PDF_TABLE_SIZE = 8
+
+
+def export_id(markdown):
+    """
+    Returns the content hash identifying the export of `markdown`.
+    """
+    payload = f"{RENDERER_VERSION}\n{markdown}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def render_html_body(tokens):
+    """
+    Renders markdown-it tokens to HTML.
+    """
+    body = MARKDOWN.renderer.render(tokens, MARKDOWN.options, {})
+    return ESCAPED_SUP_PATTERN.sub(r"<sup>\1</sup>", body)
+
+
+def winansi(text):
+    """
+    Replaces the characters the standard PDF fonts cannot show with "?".
+    """
+    return text.encode('cp1252', errors='replace').decode('cp1252')
+
+
+def plain_text(token):
+    """
+    Returns the text of an inline token without its markup.
+    """
+    return "".join(child.content for child in token.children or () if child.type in ("text", "code_inline")).strip()
+
+
+def prepare_pdf_tables(tokens, text_width, available):
+    """
+    Adapts the tables to what fpdf2 lays out. Cells become plain text, as fpdf2 has no inline
+    markup in cells, and are aligned left unless the markdown aligns them. The columns are sized to
+    their text instead of split evenly: each gets at least the width of its longest word, so that
+    no word is broken up, and the rest of the `available` width goes to the columns with longer
+    texts. `text_width(text, bold)` measures text as the PDF sets it.
+    """
+    for index, token in enumerate(tokens):
+        if token.type != "table_open":
+            continue
+        headers, floors, naturals = [], [], []
+        column = 0
+        for cell_index in range(index + 1, len(tokens)):
+            cell = tokens[cell_index]
+            if cell.type == "table_close":
+                break
+            if cell.type == "tr_open":
+                column = 0
+            elif cell.type in ("th_open", "td_open"):
+                bold = cell.type == "th_open"
+                if bold:
+                    headers.append(cell)
+                style = cell.attrGet("style") or "text-align:left"
+                cell.attrSet("align", style.partition(":")[2])
+                inline = tokens[cell_index + 1]
+                text = plain_text(inline)
+                inline.children = [Token("text", "", 0, content=text)]
+                if column == len(floors):
+                    floors.append(0)
+                    naturals.append(0)
+                floors[column] = max([floors[column]] + [text_width(word, bold) for word in text.split()])
+                naturals[column] = max(naturals[column], floors[column], text_width(text, bold))
+                column += 1
+        spare = available - sum(floors)
+        slack = [natural - floor for natural, floor in zip(naturals, floors)]
+        if sum(naturals) <= available:
+            widths = naturals
+        elif spare <= 0 or not sum(slack):
+            widths = floors
+        else:
+            widths = [floor + spare * extra / sum(slack) for floor, extra in zip(floors, slack)]
+        total = sum(widths) or 1
+        for header, width in zip(headers, widths):
+            header.attrSet("width", f"{round(100 * width / total, 1)}%")
+
+
+def render_pdf(tokens, title):
+    """
+    Lays out markdown-it tokens with fpdf2 and returns the PDF bytes. Changes the table tokens,
+    so render the HTML first.
+    """
+    document = FPDF(format="A4")
+    document.core_fonts_encoding = "windows-1252"
+    document.set_title(title)
+    document.set_margins(20, 20)
+    document.set_auto_page_break(True, margin=20)
+    document.add_page()
+
+    def text_width(text, bold):
+        document.set_font("helvetica", "B" if bold else "", PDF_TABLE_SIZE)
+        # Plus the cell padding on both sides and a millimetre for the borders and rounding
+        return document.get_string_width(winansi(text)) + 2 * document.c_margin + 1
+
+    prepare_pdf_tables(tokens, text_width, document.epw)
+    body = MARKDOWN.renderer.render(tokens, MARKDOWN.options, {})
+    # The marks of recommended features sit in table cells, so "<sup>recommended</sup>" becomes "(recommended)"
+    body = ESCAPED_SUP_PATTERN.sub(r"(\1)", body)
+    # Smaller type keeps the wide feature table readable on A4
+    body = body.replace("<table>", f'<font size="{PDF_TABLE_SIZE}"><table>').replace("</table>", "</table></font>")
+    document.set_font("helvetica", size=10.5)
+    document.write_html(
+        winansi("<h1>Project Proposal</h1>" + body),
+        font_family="helvetica",
+        ul_bullet_char="•",
+        li_prefix_color=0,
+        table_line_separators=True,
+        tag_styles=PDF_TAG_STYLES,
+    )
+    return bytes(document.output())
+
+
+def proposal_title(tokens, default="Project Proposal"):
+    """
+    Returns the proposal's title: the text of its "Title" line or section, or else its first heading.
+    """
+    blocks = [
+        (tokens[index - 1].type, plain_text(token))
+        for index, token in enumerate(tokens)
+        if token.type == "inline" and tokens[index - 1].type in ("heading_open", "paragraph_open")
+    ]
+    for index, (kind, text) in enumerate(blocks):
+        match = TITLE_PATTERN.match(text)
+        if not match:
+            continue
+        if match.group(1):
+            return match.group(1).strip()
+        # A "Title" heading with the title in the block below it
+        if kind == "heading_open" and index + 1 < len(blocks):
+            return blocks[index + 1][1] or default
+    return next((text for kind, text in blocks if kind == "heading_open" and text), default)
+
+
+def default_html_page(title, body):
+    return (
+        f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(title)}</title>\n"
+        f"</head>\n<body>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def write_atomic(path, data):
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class ExportQueue:
+    """
+    Renders proposals to HTML and PDF in the background and keeps the files by content hash.
+
+    Parameters:
+        directory (str): Where `<id>.html` and `<id>.pdf` are written.
+        workers (int): The number of proposals rendered in parallel.
+        html_page (callable): `html_page(title, body)` returns the complete HTML document around
+            the rendered body; by default a bare page.
+        ttl (float): Seconds an export is kept after it was last rendered or downloaded; 0 keeps
+            exports until they are evicted.
+        max_exports (int): The number of exports kept; the least recently used ones beyond it are
+            deleted. 0 means no limit.
+    """
+
+    def __init__(self, directory, workers=2, html_page=None, ttl=0, max_exports=0):
+        self.directory = directory
+        self.html_page = html_page or default_html_page
+        self.ttl = ttl
+        self.max_exports = max_exports
+        self.rendered = 0
+        self.removed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="export")
+        self._pending = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def path(self, export_id, fmt):
+        return os.path.join(self.directory, f"{export_id}.{fmt}")
+
+    def is_done(self, export_id):
+        return all(os.path.exists(self.path(export_id, fmt)) for fmt in EXPORT_FORMATS)
+
+    def submit(self, markdown):
+        """
+        Queues the export of `markdown` unless it is already rendered or being rendered.
+
+        Returns:
+            str: The export id.
+        """
+        key = export_id(markdown)
+        with self._lock:
+            if key in self._pending or self.is_done(key):
+                return key
+            self._failed.pop(key, None)
+            self._pending[key] = self._executor.submit(self._render, key, markdown)
+        return key
+
+    def status(self, export_id):
+        """
+        Returns "done", "pending", "failed" or None for an unknown id, and the error of a failed export.
+        """
+        with self._lock:
+            if export_id in self._pending:
+                return "pending", None
+            if export_id in self._failed:
+                return "failed", self._failed[export_id]
+        if self.is_done(export_id):
+            return "done", None
+        return None, None
+
+    def touch(self, export_id):
+        """
+        Marks an export as used, so the cleanup keeps it longest.
+        """
+        try:
+            os.utime(self.path(export_id, "pdf"))
+        except OSError:
+            pass
+
+    def cleanup(self):
+        """
+        Deletes the exports older than `ttl` and the least recently used ones beyond `max_exports`,
+        judged by the modification time of their PDF, which `touch` updates on every download.
+        Leftover files of failed or interrupted renders are deleted with them.
+        """
+        if not self.ttl and not self.max_exports:
+            return
+        used = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            match = EXPORT_FILE_PATTERN.match(name)
+            if not match:
+                continue
+            try:
+                modified = os.path.getmtime(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            key = match.group(1)
+            # The PDF decides; an HTML file without its PDF is as old as it gets
+            used[key] = modified if match.group(2) == "pdf" else used.get(key, float("-inf"))
+        by_use = sorted(used, key=used.get, reverse=True)
+        expired = [key for key in by_use if self.ttl and used[key] < time.time() - self.ttl]
+        evicted = by_use[self.max_exports:] if self.max_exports else []
+        with self._lock:
+            stale = set(expired + evicted) - set(self._pending)
+        for key in stale:
+            # The PDF goes first, so the export stops counting as done before its HTML disappears
+            for fmt in ("pdf", "html"):
+                try:
+                    os.remove(self.path(key, fmt))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self.removed += len(stale)
+        if stale:
+            logger.info("Removed %d old proposal exports", len(stale))
+
+    def _render(self, key, markdown):
+        try:
+            tokens = MARKDOWN.parse(markdown)
+            title = proposal_title(tokens)
+            os.makedirs(self.directory, exist_ok=True)
+            # The PDF is written last, so both files exist once `is_done` sees it
+            page = self.html_page(title, render_html_body(tokens))
+            write_atomic(self.path(key, "html"), page.encode('utf-8'))
+            write_atomic(self.path(key, "pdf"), render_pdf(tokens, title))
+            with self._lock:
+                self.rendered += 1
+        except Exception as e:
+            logger.exception("Exporting proposal %s failed", key)
+            with self._lock:
+                self._failed[key] = str(e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        try:
+            self.cleanup()
+        except Exception:
+            logger.exception("Cleaning up the proposal exports failed")
+
+
+def export_queue_from_env(html_page=None):
+    """
+    Creates an ExportQueue writing to EXPORT_DIR (default "exports") with EXPORT_WORKERS workers
+    (default 2), keeping exports for EXPORT_TTL seconds (default 7 days) since their last use and
+    at most EXPORT_MAX_FILES of them (default 1000).
+    """
+    return ExportQueue(
+        os.getenv("EXPORT_DIR", "exports"),
+        workers=int(os.getenv("EXPORT_WORKERS", "2")),
+        html_page=html_page,
+        ttl=float(os.getenv("EXPORT_TTL", str(7 * 24 * 3600))),
+        max_exports=int(os.getenv("EXPORT_MAX_FILES", "1000")),
+    )
@@ -0,0 +1,274 @@
+import re
+import ast
+import json
+
+NO_QUESTIONS = "No additional questions needed."
+
+
+class IncrementalJSONParser:
+    """
+    Tracks a JSON object while the LLM output arrives chunk by chunk.
+
+    Text before the first "{" (markdown fences, preambles) is ignored. The parser follows string
+    and nesting state character by character, so it knows when the top-level object is closed and
+    which top-level keys already have a complete value. That lets the caller stop the generation
+    as soon as everything it needs has arrived instead of paying for trailing text.
+
+    Parameters:
+        expected_keys (iterable): Top-level keys that, once all complete, make the result complete.
+    """
+
+    def __init__(self, expected_keys=None):
+        self.expected_keys = set(expected_keys or ())
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self.completed_keys = set()
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._quote = None
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._in_value = False
+
+    @property
+    def closed(self):
+        """
+        True once the top-level object has been closed.
+        """
+        return self.end != -1
+
+    @property
+    def complete(self):
+        """
+        True once the object is closed or every expected key has a complete value.
+        """
+        if self.closed:
+            return True
+        return bool(self.expected_keys) and self.expected_keys <= self.completed_keys
+
+    def feed(self, chunk):
+        """
+        Consumes the next chunk of LLM output and returns `complete`.
+        """
+        offset = len(self.text)
+        self.text += chunk
+        if self.closed:
+            return True
+        for index in range(offset, len(self.text)):
+            self._step(self.text[index], index)
+            if self.closed:
+                break
+        return self.complete
+
+    def _finish_value(self):
+        if self._current_key is not None:
+            self.completed_keys.add(self._current_key)
+        self._current_key = None
+        self._in_value = False
+
+    def _step(self, char, index):
+        if self.start == -1:
+            if char == '{':
+                self.start = index
+                self._depth = 1
+            return
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == self._quote:
+                self._in_string = False
+                self._last_string = self.text[self._string_start:index]
+            return
+        if char in ('"', "'"):
+            self._in_string = True
+            self._quote = char
+            self._string_start = index + 1
+        elif char in '{[':
+            self._depth += 1
+        elif char in '}]':
+            self._depth -= 1
+            if self._depth == 0:
+                if self._in_value:
+                    self._finish_value()
+                self.end = index
+        elif self._depth == 1:
+            if char == ':' and not self._in_value:
+                self._current_key = self._last_string
+                self._in_value = True
+            elif char == ',' and self._in_value:
+                self._finish_value()
+
+    def json_text(self):
+        """
+        Returns the JSON part of the output received so far, or all of it if no object started.
+        """
+        if self.start == -1:
+            return self.text
+        return self.text[self.start:self.end + 1] if self.closed else self.text[self.start:]
+
+    def result(self):
+        """
+        Returns the parsed object, repairing it (and closing it if the stream was cut short)
+        where necessary.
+        """
+        if self.start == -1:
+            raise ValueError("No JSON object found in the LLM output")
+        end = self.end + 1 if self.closed else len(self.text)
+        return loads_tolerant(self.text[self.start:end])
+
+
+def _strip_fences(text):
+    return re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text.strip())
+
+
+def _balanced_slice(text):
+    """
+    Returns `text` from the first "{" or "[" to its matching close, appending the missing
+    closing brackets when the text was cut off.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object found in the LLM output")
+    start = min(starts)
+    stack = []
+    quote = None
+    escape = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == quote:
+                quote = None
+            continue
+        if char in ('"', "'"):
+            quote = char
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[start:index + 1]
+    tail = quote or ''
+    return text[start:] + tail + ''.join(reversed(stack))
+
+
+def _normalize_tokens(text):
+    """
+    Rewrites single-quoted strings as JSON strings, drops trailing commas and maps Python
+    literals to JSON ones, leaving the contents of double-quoted strings untouched.
+    """
+    out = []
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if char in ('"', "'"):
+            quote = char
+            index += 1
+            value = []
+            while index < length:
+                char = text[index]
+                if char == '\\' and index + 1 < length:
+                    value.append(text[index:index + 2])
+                    index += 2
+                    continue
+                if char == quote:
+                    break
+                value.append(char)
+                index += 1
+            index += 1
+            value = ''.join(value)
+            if quote == "'":
+                value = value.replace("\\'", "'").replace('"', '\\"')
+            out.append('"' + value.replace('\n', '\\n') + '"')
+            continue
+        if char == ',':
+            lookahead = index + 1
+            while lookahead < length and text[lookahead].isspace():
+                lookahead += 1
+            if lookahead >= length or text[lookahead] in '}]':
+                index += 1
+                continue
+        match = re.match(r"(True|False|None)\b", text[index:index + 5])
+        if match and (index == 0 or not (text[index - 1].isalnum() or text[index - 1] == '_')):
+            out.append({"True": "true", "False": "false", "None": "null"}[match.group(1)])
+            index += len(match.group(1))
+            continue
+        out.append(char)
+        index += 1
+    return ''.join(out)
+
+
+def repair_json(text):
+    """
+    Repairs the usual defects in LLM-produced JSON: markdown fences, surrounding prose,
+    single-quoted strings, trailing commas, Python literals and missing closing brackets.
+
+    Parameters:
+        text (str): The raw LLM output.
+
+    Returns:
+        str: A JSON string.
+    """
+    return _normalize_tokens(_balanced_slice(_strip_fences(text)))
+
+
+def loads_tolerant(text):
+    """
+    Parses JSON from LLM output, falling back to a Python literal and then to `repair_json`.
+
+    Parameters:
+        text (str): The raw LLM output or a serialized dictionary.
+
+    Returns:
+        object: The parsed value.
+    """
+    if not isinstance(text, str):
+        return text
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    try:
+        return json.loads(repair_json(text))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Could not parse JSON from the LLM output: {e}")
+
+
+def parse_questions(text):
+    """
+    Parses the question chain output, which is either a JSON object of questions or the plain
+    "No additional questions needed." sentence.
+
+    Parameters:
+        text (str or dict): The question chain output.
+
+    Returns:
+        dict: The questions, or {"result": "No additional questions needed."}.
+    """
+    if isinstance(text, dict):
+        return text
+    try:
+        questions = loads_tolerant(text)
+    except ValueError:
+        if NO_QUESTIONS.lower().rstrip('.') in str(text).lower():
+            return {"result": NO_QUESTIONS}
+        raise
+    if isinstance(questions, str) and NO_QUESTIONS.lower().rstrip('.') in questions.lower():
+        return {"result": NO_QUESTIONS}
+    if not isinstance(questions, dict):
+        raise ValueError("The generated questions are not a JSON object")
+    return questions
@@ -0,0 +1,349 @@
+"""
+Chat model backends for the shared `llm` in app.py.
+
+A backend is a factory returning a LangChain chat model; every chain is built from that model, so
+anything implementing `BaseChatModel` (invoke, stream and their async variants) can be plugged in
+with `register_backend`. LLM_BACKEND selects the backend:
+
+- `gemini` (default): Google Gemini through langchain-google-genai, configured with GOOGLE_API_KEY.
+- `fake`: `ReplayChatModel`, which answers from recorded responses with a configurable latency and
+  token rate and needs neither network access nor an API key. Used by the benchmarks.
+
+Whatever the backend, app.get_llm wraps it in `GuardedChatModel` (see `guard_from_env`), which adds
+the rate limiting, retries and call coalescing of upstream.py.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from retrieval import estimate_tokens
+from tracing import record_retry
+from upstream import RateLimiter, RetryPolicy, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "recorded_responses.json")
+
+# Characters per streamed token, the same estimate retrieval.estimate_tokens uses
+CHARS_PER_TOKEN = 4
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    A deterministic chat model that replays recorded responses.
+
+    Each recording has a `match` substring and a list of `responses`; the first recording whose
+    substring occurs in the prompt answers, picking one of its responses by a hash of the prompt so
+    the same prompt always gets the same answer. Prompts matching no recording get `default_response`.
+
+    The model waits `latency` seconds before the first token and then produces `tokens_per_second`
+    tokens per second (0 returns the rest at once), for both `invoke` and `stream`. Streams are
+    delivered in chunks of `chunk_tokens` tokens.
+    """
+
+    recordings: list = []
+    default_response: str = "{}"
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    chunk_tokens: int = 16
+    model: str = "replay"
+    temperature: float = 0.0
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RESPONSES_PATH, **kwargs):
+        """
+        Creates the model from a JSON file with `recordings` and an optional `default_response`.
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        return cls(
+            recordings=data.get("recordings", []),
+            default_response=data.get("default_response", "{}"),
+            **kwargs,
+        )
+
+    @property
+    def _llm_type(self):
+        return "replay"
+
+    def response_for(self, messages):
+        """
+        Returns the recorded response for a prompt.
+        """
+        prompt = "\n".join(str(message.content) for message in messages)
+        for recording in self.recordings:
+            if recording.get("match", "") in prompt and recording.get("responses"):
+                responses = recording["responses"]
+                digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+                return responses[digest % len(responses)]
+        return self.default_response
+
+    def _tokens(self, text):
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def _chunks(self, text):
+        # (chunk, tokens produced once the chunk is complete)
+        size = CHARS_PER_TOKEN * max(1, self.chunk_tokens)
+        return [(text[i:i + size], self._tokens(text[:i + size])) for i in range(0, len(text), size)]
+
+    def _ready_at(self, started, tokens):
+        # When `tokens` tokens are due; computed from the start so that the sleeps do not drift
+        generation = tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        return started + self.latency + generation
+
+    def _duration(self, text):
+        return self._ready_at(0.0, self._tokens(text))
+
+    def _result(self, text):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.response_for(messages)
+        time.sleep(self._duration(text))
+        return self._result(text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.response_for(messages)
+        await asyncio.sleep(self._duration(text))
+        return self._result(text)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        for chunk, tokens in self._chunks(self.response_for(messages)):
+            delay = self._ready_at(started, tokens) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.perf_counter()
+        for chunk, tokens in self._chunks(self.response_for(messages)):
+            delay = self._ready_at(started, tokens) - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+def create_gemini_llm():
+    """
+    Configures the Gemini client and creates the chat model.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise EnvironmentError("GOOGLE_API_KEY not found in environment variables")
+    import google.generativeai as genai
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    genai.configure(api_key=api_key)
+    try:
+        return ChatGoogleGenerativeAI(model="gemini-pro", max_output_tokens=30000,temperature=0.001)
+    except Exception as e:
+        raise RuntimeError(f"Failed to initialize ChatGoogleGenerativeAI: {e}")
+
+
+def create_fake_llm():
+    """
+    Creates a ReplayChatModel from FAKE_LLM_RESPONSES (defaults to benchmarks/recorded_responses.json),
+    FAKE_LLM_LATENCY (seconds before the first token), FAKE_LLM_TOKENS_PER_SECOND and
+    FAKE_LLM_CHUNK_TOKENS (tokens per streamed chunk).
+    """
+    return ReplayChatModel.from_file(
+        os.getenv("FAKE_LLM_RESPONSES") or DEFAULT_RESPONSES_PATH,
+        latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+        chunk_tokens=int(os.getenv("FAKE_LLM_CHUNK_TOKENS", "16")),
+    )
+
+
+LLM_BACKENDS = {
+    "gemini": create_gemini_llm,
+    "fake": create_fake_llm,
+}
+
+
+def register_backend(name, factory):
+    """
+    Makes `factory()` available as LLM_BACKEND=`name`.
+    """
+    LLM_BACKENDS[name] = factory
+
+
+def create_llm(backend=None):
+    """
+    Creates the chat model of `backend`, by default the one named by LLM_BACKEND.
+    """
+    backend = (backend or os.getenv("LLM_BACKEND", "gemini")).lower()
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend}. Use one of {', '.join(sorted(LLM_BACKENDS))}")
+    return LLM_BACKENDS[backend]()
+
+
+def call_key(kind, messages, stop, kwargs):
+    """
+    Identifies a model call by its kind (invoke or stream), messages, stop words and options.
+    """
+    payload = json.dumps(
+        [kind, [(message.type, message.content) for message in messages], stop, kwargs],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GuardedChatModel(BaseChatModel):
+    """
+    Wraps `inner` with the single-flight coalescing, rate limiting and retries of upstream.py.
+    Any of `limiter`, `retry` and `single_flight` may be None to turn that part off.
+
+    `model` and `temperature` are those of `inner`, so the response cache keys do not change.
+    """
+
+    inner: Any
+    limiter: Any = None
+    retry: Any = None
+    single_flight: Any = None
+
+    @property
+    def _llm_type(self):
+        return f"guarded-{self.inner._llm_type}"
+
+    @property
+    def model(self):
+        return getattr(self.inner, "model", None)
+
+    @property
+    def temperature(self):
+        return getattr(self.inner, "temperature", None)
+
+    def _prompt_tokens(self, messages):
+        return estimate_tokens("\n".join(str(message.content) for message in messages))
+
+    def _retry_delay(self, attempt, error, started=False):
+        # The wait before retrying a failed attempt; raises the error to give up with instead
+        if started or self.retry is None:
+            raise error
+        if not self.retry.should_retry(attempt, error):
+            failure = self.retry.give_up(attempt, error)
+            if failure is error:
+                raise error
+            raise failure from error
+        delay = self.retry.delay(attempt, error)
+        logger.warning("LLM call failed (%s); retrying in %.1fs", error, delay)
+        record_retry()
+        return delay
+
+    def _call(self, function, messages):
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(self._prompt_tokens(messages))
+            try:
+                return function()
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, e))
+            attempt += 1
+
+    async def _acall(self, function, messages):
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.aacquire(self._prompt_tokens(messages))
+            try:
+                return await function()
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e))
+            attempt += 1
+
+    def _call_stream(self, function, messages):
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(self._prompt_tokens(messages))
+            started = False
+            try:
+                for chunk in function():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, e, started))
+            attempt += 1
+
+    async def _acall_stream(self, function, messages):
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.aacquire(self._prompt_tokens(messages))
+            started = False
+            try:
+                async for chunk in function():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, started))
+            attempt += 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        def call():
+            return self._call(lambda: self.inner._generate(messages, stop=stop, **kwargs), messages)
+        if self.single_flight is None:
+            return call()
+        return self.single_flight.do(call_key("generate", messages, stop, kwargs), call)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        def call():
+            return self._acall(lambda: self.inner._agenerate(messages, stop=stop, **kwargs), messages)
+        if self.single_flight is None:
+            return await call()
+        return await self.single_flight.ado(call_key("generate", messages, stop, kwargs), call)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        def call():
+            return self._call_stream(lambda: self.inner._stream(messages, stop=stop, **kwargs), messages)
+        chunks = call() if self.single_flight is None else \
+            self.single_flight.stream(call_key("stream", messages, stop, kwargs), call)
+        for chunk in chunks:
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        def call():
+            return self._acall_stream(lambda: self.inner._astream(messages, stop=stop, **kwargs), messages)
+        chunks = call() if self.single_flight is None else \
+            self.single_flight.astream(call_key("stream", messages, stop, kwargs), call)
+        async for chunk in chunks:
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def guard_from_env(inner):
+    """
+    Wraps `inner` in a GuardedChatModel configured from LLM_RPM and LLM_TPM (requests and prompt
+    tokens per minute, 0 for no limit), LLM_RATE_BURST (seconds of quota usable at once),
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY and LLM_RETRY_MAX_DELAY (seconds) and LLM_COALESCE.
+    Returns `inner` unchanged when LLM_GUARD is off.
+    """
+    if os.getenv("LLM_GUARD", "1").lower() in ("0", "false", "no"):
+        return inner
+    rpm = float(os.getenv("LLM_RPM", "0"))
+    tpm = float(os.getenv("LLM_TPM", "0"))
+    coalesce = os.getenv("LLM_COALESCE", "1").lower() not in ("0", "false", "no")
+    return GuardedChatModel(
+        inner=inner,
+        limiter=RateLimiter(rpm, tpm, float(os.getenv("LLM_RATE_BURST", "60"))) if rpm or tpm else None,
+        retry=RetryPolicy(
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "20")),
+        ),
+        single_flight=SingleFlight() if coalesce else None,
+    )
@@ -0,0 +1,181 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Stage timings, token counts, LLM calls, retries and cache hits are recorded by `tracing.stage`,
+rate limiter waits and coalesced calls by upstream.py and request timings by the web layers;
+`/metrics` serves `render_metrics()`. Values are kept per process, so with several workers each one
+is scraped separately.
+"""
+import math
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing count per label combination.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Counters without labels are exposed from the start, at 0
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """
+    Observations bucketed per label combination, with their count and sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = tuple(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield self.name + "_bucket", labels + (("le", _format_value(float(bound))),), count
+            yield self.name + "_count", labels, counts[-1]
+            yield self.name + "_sum", labels, total
+
+
+class MetricsRegistry:
+    """
+    The set of metrics rendered on `/metrics`.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram(
+    "proposal_request_duration_seconds", "Wall time of HTTP requests.", ("route", "method", "status"),
+))
+stage_duration = registry.register(Histogram(
+    "proposal_stage_duration_seconds", "Wall time of pipeline stages.", ("stage",),
+))
+stage_tokens = registry.register(Histogram(
+    "proposal_stage_tokens", "Estimated prompt and completion tokens per LLM call.", ("stage", "kind"),
+    buckets=TOKEN_BUCKETS,
+))
+llm_calls = registry.register(Counter(
+    "proposal_llm_calls_total", "LLM round-trips per stage.", ("stage",),
+))
+llm_retries = registry.register(Counter(
+    "proposal_llm_retries_total", "Retried LLM calls per stage.", ("stage",),
+))
+cache_hits = registry.register(Counter(
+    "proposal_cache_hits_total", "Stages answered from the response cache.", ("stage",),
+))
+rate_limit_wait = registry.register(Counter(
+    "proposal_llm_rate_limit_wait_seconds_total", "Time LLM calls waited for the client-side rate limiter.",
+))
+coalesced_calls = registry.register(Counter(
+    "proposal_llm_coalesced_total", "LLM calls served by an identical call already in flight.",
+))
+
+
+def observe_stage(name, duration, llm=False, cache_hit=False, prompt_tokens=0, completion_tokens=0, retries=0):
+    """
+    Records one finished pipeline stage.
+    """
+    if cache_hit:
+        cache_hits.inc(stage=name)
+        return
+    stage_duration.observe(duration, stage=name)
+    if llm:
+        llm_calls.inc(stage=name)
+        stage_tokens.observe(prompt_tokens, stage=name, kind="prompt")
+        stage_tokens.observe(completion_tokens, stage=name, kind="completion")
+    if retries:
+        llm_retries.inc(retries, stage=name)
+
+
+def observe_request(route, method, status, duration):
+    """
+    Records one finished HTTP request.
+    """
+    request_duration.observe(duration, route=route, method=method, status=status)
+
+
+def observe_rate_limit_wait(seconds):
+    rate_limit_wait.inc(seconds)
+
+
+def observe_coalesced():
+    coalesced_calls.inc()
+
+
+def render_metrics():
+    return registry.render()
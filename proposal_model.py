@@ -0,0 +1,274 @@
+import re
+import json
+import math
+
+from json_stream import loads_tolerant
+
+FEATURE_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*(\{.*?\"features\".*?\})\s*```", re.DOTALL)
+
+TABLE_COLUMNS = (
+    "Main Feature", "Sub-Feature", "Description", "Complexity",
+    "Frontend Time (hours)", "Backend Time (hours)", "User Value",
+)
+
+
+def to_hours(value):
+    """
+    Converts an hours value from the LLM or the CSV to a float; blanks and text become 0.
+    """
+    try:
+        hours = float(str(value).strip())
+    except (TypeError, ValueError):
+        return 0.0
+    return hours if math.isfinite(hours) and hours > 0 else 0.0
+
+
+def find_feature_block(text):
+    """
+    Locates the structured feature JSON in the proposal output.
+
+    Returns:
+        tuple: `(start, end, data)` of the block, or None when the output has no feature block.
+    """
+    match = FEATURE_BLOCK_PATTERN.search(text)
+    if match:
+        start, end, raw = match.start(), match.end(), match.group(1)
+    else:
+        key = text.find('"features"')
+        start = text.rfind('{', 0, key) if key != -1 else -1
+        if start == -1:
+            return None
+        end, raw = len(text), text[start:]
+    try:
+        data = loads_tolerant(raw)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("features"), list):
+        return None
+    if not match:
+        end = start + len(raw.rstrip())
+    return start, end, data
+
+
+def normalize_features(items, estimate=None):
+    """
+    Cleans the feature list returned by the model. Rows without a main feature inherit the one
+    above them and hours become numbers. When an `estimate` function is given, all sub-features
+    are looked up in one call and those found in the estimates data take their hours from it
+    instead of the model's guess.
+
+    Parameters:
+        items (list): Feature dictionaries from the model.
+        estimate (callable): A function taking a list of sub-feature names and returning, for each,
+            {"frontend_hours": float, "backend_hours": float} or None (e.g. `EstimateEngine.lookup_hours`).
+
+    Returns:
+        list: Feature dictionaries with the keys feature, sub_feature, description, complexity,
+        frontend_hours, backend_hours, user_value, recommended and source.
+    """
+    features = []
+    parent = ""
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        parent = str(item.get("feature") or parent).strip()
+        features.append({
+            "feature": parent,
+            "sub_feature": str(item.get("sub_feature", "")).strip().lstrip("- "),
+            "description": str(item.get("description", "")).strip(),
+            "complexity": str(item.get("complexity", "")).strip(),
+            "frontend_hours": to_hours(item.get("frontend_hours")),
+            "backend_hours": to_hours(item.get("backend_hours")),
+            "user_value": str(item.get("user_value", "")).strip(),
+            "recommended": bool(item.get("recommended")),
+            "source": "model",
+        })
+    if estimate is not None and features:
+        for feature, reference in zip(features, estimate([feature["sub_feature"] for feature in features])):
+            if reference:
+                feature.update(reference)
+                feature["source"] = "estimates"
+    return features
+
+
+def compute_totals(features, database_hours=0, cicd_hours=0, hours_per_day=8):
+    """
+    Adds up the development hours and converts the total to working days, weeks and months
+    (5 working days a week, 22 a month).
+
+    Returns:
+        dict: The hours per area, the total and its days/weeks/months equivalent.
+    """
+    frontend = sum(feature["frontend_hours"] for feature in features)
+    backend = sum(feature["backend_hours"] for feature in features)
+    database = to_hours(database_hours)
+    cicd = to_hours(cicd_hours)
+    total = frontend + backend + database + cicd
+    days = total / hours_per_day if hours_per_day else 0.0
+    return {
+        "frontend_hours": frontend,
+        "backend_hours": backend,
+        "database_hours": database,
+        "cicd_hours": cicd,
+        "total_hours": total,
+        "hours_per_day": hours_per_day,
+        "days": days,
+        "weeks": days / 5,
+        "months": days / 22,
+    }
+
+
+def format_hours(hours):
+    return f"{hours:g}" if hours == int(hours) else f"{hours:.1f}"
+
+
+def render_feature_table(features):
+    """
+    Renders the feature list as the markdown table proposal.html displays, showing each main
+    feature only on the first row of its group.
+    """
+    lines = [
+        "| " + " | ".join(TABLE_COLUMNS) + " |",
+        "|" + "|".join("---" for _ in TABLE_COLUMNS) + "|",
+    ]
+    previous = None
+    for feature in features:
+        name = ""
+        if feature["feature"] != previous:
+            name = feature["feature"] + (" <sup>recommended</sup>" if feature["recommended"] else "")
+            previous = feature["feature"]
+        cells = (
+            name,
+            "- " + feature["sub_feature"],
+            feature["description"],
+            feature["complexity"],
+            format_hours(feature["frontend_hours"]),
+            format_hours(feature["backend_hours"]),
+            feature["user_value"],
+        )
+        lines.append("| " + " | ".join(cell.replace("|", "\\|") for cell in cells) + " |")
+    return "\n".join(lines)
+
+
+def render_timeline(totals):
+    """
+    Renders the timeline breakdown section from `compute_totals`.
+    """
+    return "\n".join([
+        "## Timeline Breakdown",
+        "",
+        "Development Timeline:",
+        f"- Frontend Development: {format_hours(totals['frontend_hours'])} hours",
+        f"- Backend Development: {format_hours(totals['backend_hours'])} hours",
+        f"- Database Design and Implementation: {format_hours(totals['database_hours'])} hours",
+        f"- Continuous Integration/Continuous Deployment Setup: {format_hours(totals['cicd_hours'])} hours",
+        "",
+        f"**Total Estimated Timeline: {format_hours(totals['total_hours'])} hours** "
+        f"(about {totals['days']:.1f} days, {totals['weeks']:.1f} weeks or {totals['months']:.1f} months "
+        f"at {format_hours(totals['hours_per_day'])} hours a day)",
+    ])
+
+
+def finalize_proposal(text, estimate=None, hours_per_day=8):
+    """
+    Replaces the structured feature block in the model's proposal with the rendered feature table
+    and a timeline whose totals are computed locally. Text without a feature block is returned
+    unchanged, so finished proposals can be passed through again safely.
+
+    Parameters:
+        text (str): The proposal as returned by the model.
+        estimate (callable): Hours lookup for sub-features, see `normalize_features`.
+        hours_per_day (float): Working hours per day for the days/weeks/months conversion.
+
+    Returns:
+        str: The proposal markdown.
+    """
+    if not isinstance(text, str):
+        return text
+    block = find_feature_block(text)
+    if block is None:
+        return text
+    start, end, data = block
+    features = normalize_features(data["features"], estimate)
+    totals = compute_totals(features, data.get("database_hours"), data.get("cicd_hours"), hours_per_day)
+    before = text[:start].rstrip()
+    after = text[end:].strip()
+    parts = [before, render_feature_table(features), render_timeline(totals)]
+    if after:
+        parts.append(after)
+    return "\n\n".join(part for part in parts if part)
+
+
+def outline_features(outline):
+    """
+    Cleans the feature outline of a section-parallel proposal.
+
+    Returns:
+        list: `{"feature", "sub_features", "recommended"}` dictionaries for the main features that
+        have a name.
+    """
+    features = []
+    for item in outline.get("features", []) if isinstance(outline, dict) else []:
+        if not isinstance(item, dict) or not str(item.get("feature", "")).strip():
+            continue
+        sub_features = item.get("sub_features") or []
+        if isinstance(sub_features, str):
+            sub_features = sub_features.split(",")
+        features.append({
+            "feature": str(item["feature"]).strip(),
+            "sub_features": [str(name).strip().lstrip("- ") for name in sub_features if str(name).strip()],
+            "recommended": bool(item.get("recommended")),
+        })
+    return features
+
+
+def split_feature_groups(features, groups):
+    """
+    Splits the outline into at most `groups` consecutive groups with similar numbers of sub-features,
+    keeping each main feature in one group.
+    """
+    groups = max(1, min(groups, len(features)))
+    target = sum(max(1, len(feature["sub_features"])) for feature in features) / groups if features else 0
+    result = [[]]
+    size = 0
+    for feature in features:
+        weight = max(1, len(feature["sub_features"]))
+        if result[-1] and size + weight / 2 > target and len(result) < groups:
+            result.append([])
+            size = 0
+        result[-1].append(feature)
+        size += weight
+    return [group for group in result if group]
+
+
+def format_feature_outline(features):
+    """
+    Lists main features and their sub-features as prompt lines.
+    """
+    return "\n".join(
+        f"- {feature['feature']}{' (recommended)' if feature['recommended'] else ''}: {', '.join(feature['sub_features'])}"
+        for feature in features
+    )
+
+
+def merge_sections(overview, group_features, database_hours=0, cicd_hours=0):
+    """
+    Joins the overview sections and the feature groups of a section-parallel proposal into the
+    proposal shape of the structured single-call output, for `finalize_proposal` to complete.
+
+    Parameters:
+        overview (str): The title, summary, technology stack and tags sections.
+        group_features (list): The feature list of each group, in outline order.
+        database_hours (float): Hours for database design and implementation.
+        cicd_hours (float): Hours for the CI/CD setup.
+
+    Returns:
+        str: The proposal markdown with the features as a JSON code block.
+    """
+    features = [feature for group in group_features for feature in group]
+    block = json.dumps({
+        "features": features,
+        "database_hours": to_hours(database_hours),
+        "cicd_hours": to_hours(cicd_hours),
+    }, indent=2)
+    return f"{overview.strip()}\n\n## 5. Major Features and Sub-Features\n\n```json\n{block}\n```"
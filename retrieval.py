@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Very common words in drafts that carry no signal for matching features
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in", "is", "it", "like",
+    "of", "on", "or", "should", "that", "the", "their", "there", "to", "want", "we", "which", "with",
+    "add", "build", "create", "feature", "features", "project", "provided", "not", "website", "what",
+    "you", "your", "would",
+}
+
+
+def tokenize(text):
+    """
+    Lowercases `text` and splits it into alphanumeric terms, dropping stopwords and
+    folding a trailing plural "s".
+    """
+    terms = []
+    for term in TOKEN_PATTERN.findall(str(text).lower()):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of LLM tokens in `text` (roughly four characters per token).
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+class BM25Index:
+    """
+    A small in-memory Okapi BM25 index over a list of documents.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        document_frequency = Counter()
+        for terms in self.doc_terms:
+            document_frequency.update(terms.keys())
+        total = len(self.doc_terms)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    def scores(self, query):
+        """
+        Returns the BM25 score of every document for `query`.
+        """
+        query_terms = [term for term in set(tokenize(query)) if term in self.idf]
+        results = []
+        for terms, length in zip(self.doc_terms, self.doc_lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in query_terms:
+                freq = terms.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+    def top_k(self, query, k):
+        """
+        Returns the indices of the `k` best-scoring documents with a positive score, best first.
+        """
+        scores = self.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        return ranked[:k]
+
+
+def fill_parent_features(records, parent_key="Main Feature"):
+    """
+    Returns copies of the CSV records where continuation rows (empty "Main Feature") inherit
+    the main feature of the row above them.
+    """
+    filled = []
+    parent = ""
+    for record in records:
+        record = dict(record)
+        if str(record.get(parent_key, "")).strip():
+            parent = record[parent_key]
+        else:
+            record[parent_key] = parent
+        filled.append(record)
+    return filled
+
+
+class ProposalContextRetriever:
+    """
+    Selects the timeline rows and tags relevant to a draft so the proposal prompt carries
+    only what the model needs instead of the full estimates database and tag list.
+
+    Parameters:
+        records (list): Timeline CSV rows as dictionaries.
+        tags (list): The available technology tags.
+        token_budget (int): Maximum estimated tokens for timeline rows and tags together.
+        top_k_rows (int): Maximum number of timeline rows to include.
+        top_k_tags (int): Maximum number of tags to include.
+    """
+
+    def __init__(self, records, tags, token_budget=3000, top_k_rows=25, top_k_tags=40):
+        self.records = fill_parent_features(records)
+        self.tags = [tag.strip() for tag in tags if tag.strip()]
+        self.token_budget = token_budget
+        self.top_k_rows = top_k_rows
+        self.top_k_tags = top_k_tags
+        self.row_index = BM25Index([
+            " ".join(str(record.get(column, "")) for column in ("Main Feature", "Add-on", "Category"))
+            for record in self.records
+        ])
+        self.tag_index = BM25Index(self.tags)
+        # Rows and tags are serialized once here so that requests only join the selected fragments
+        self.row_fragments = [json.dumps(record) for record in self.records]
+        self.row_tokens = [estimate_tokens(fragment) + 1 for fragment in self.row_fragments]
+        self.tag_tokens = [estimate_tokens(tag) + 1 for tag in self.tags]
+        self.full_tokens = estimate_tokens(json.dumps(records)) + estimate_tokens(", ".join(self.tags))
+
+    def select(self, all_info, token_budget=None, top_k_rows=None, top_k_tags=None):
+        """
+        Returns `(timeline_data, all_tags)` prompt fragments for `all_info`, trimmed to the
+        token budget.
+
+        Parameters:
+            all_info (dict or str): The extracted project information.
+            token_budget (int): Overrides the configured token budget for this call.
+            top_k_rows (int): Overrides the configured row limit for this call; 0 selects no rows.
+            top_k_tags (int): Overrides the configured tag limit for this call; 0 selects no tags,
+                and the rows may then use the whole budget.
+
+        Returns:
+            tuple: The timeline rows as a JSON string and the tags as a comma-separated string.
+        """
+        token_budget = self.token_budget if token_budget is None else token_budget
+        top_k_rows = self.top_k_rows if top_k_rows is None else top_k_rows
+        top_k_tags = self.top_k_tags if top_k_tags is None else top_k_tags
+        query = " ".join(str(value) for value in all_info.values()) if isinstance(all_info, dict) else str(all_info)
+
+        row_ids = self.row_index.top_k(query, top_k_rows) if top_k_rows else []
+        if top_k_rows and not row_ids:
+            row_ids = list(range(min(top_k_rows, len(self.records))))
+        rows = []
+        row_budget = int(token_budget * 0.75) if top_k_tags else token_budget
+        used = 0
+        for i in row_ids:
+            cost = self.row_tokens[i]
+            if rows and used + cost > row_budget:
+                break
+            rows.append(self.row_fragments[i])
+            used += cost
+        timeline_data = "[" + ", ".join(rows) + "]"
+
+        tag_ids = self.tag_index.top_k(query, top_k_tags) if top_k_tags else []
+        if top_k_tags and not tag_ids:
+            tag_ids = list(range(min(top_k_tags, len(self.tags))))
+        tags = []
+        tag_budget = token_budget - estimate_tokens(timeline_data)
+        used = 0
+        for i in tag_ids:
+            cost = self.tag_tokens[i]
+            if tags and used + cost > tag_budget:
+                break
+            tags.append(self.tags[i])
+            used += cost
+        all_tags = ", ".join(tags)
+
+        selected_tokens = estimate_tokens(timeline_data) + estimate_tokens(all_tags)
+        logger.info(
+            "Proposal context: %d timeline rows, %d tags, ~%d tokens (saved ~%d of ~%d)",
+            len(rows), len(tags), selected_tokens, self.full_tokens - selected_tokens, self.full_tokens,
+        )
+        return timeline_data, all_tags
+
+
+def retriever_from_env(records, tags):
+    """
+    Creates a ProposalContextRetriever configured from RETRIEVAL_TOKEN_BUDGET,
+    RETRIEVAL_TOP_K_ROWS and RETRIEVAL_TOP_K_TAGS.
+    """
+    return ProposalContextRetriever(
+        records,
+        tags,
+        token_budget=int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "3000")),
+        top_k_rows=int(os.getenv("RETRIEVAL_TOP_K_ROWS", "25")),
+        top_k_tags=int(os.getenv("RETRIEVAL_TOP_K_TAGS", "40")),
+    )
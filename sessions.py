@@ -0,0 +1,51 @@
+import os
+import secrets
+import threading
+
+from cache import ResponseCache
+
+
+class SessionStore(ResponseCache):
+    """
+    Server-side state for the multi-step questionnaire, keyed by a short random token.
+
+    A session holds what the first step computed (the draft, the extracted information, the
+    question results and any proposal generated for it) so the follow-up step only sends the
+    token and the answers, and can reuse that work instead of calling the LLM again. Sessions
+    are kept in an LRU with TTL eviction and optionally in SQLite, like the response cache.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600, db_path=None):
+        super().__init__(max_size=max_size, ttl=ttl, db_path=db_path, table="sessions")
+        self._update_lock = threading.Lock()
+
+    def create(self, **data):
+        """
+        Stores a new session and returns its token.
+        """
+        token = secrets.token_urlsafe(12)
+        self.set(token, data)
+        return token
+
+    def update(self, token, **data):
+        """
+        Merges `data` into the session and returns it, or returns None when the session has expired.
+        """
+        with self._update_lock:
+            session = self.get(token)
+            if session is None:
+                return None
+            session = {**session, **data}
+            self.set(token, session)
+            return session
+
+
+def session_store_from_env():
+    """
+    Creates the session store from SESSION_STORE_SIZE, SESSION_TTL and SESSION_STORE_DB.
+    """
+    return SessionStore(
+        max_size=int(os.getenv("SESSION_STORE_SIZE", "1024")),
+        ttl=float(os.getenv("SESSION_TTL", "3600")),
+        db_path=os.getenv("SESSION_STORE_DB") or None,
+    )
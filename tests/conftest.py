@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The tests run against the replay model, with the data files loaded once
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("DATA_CHECK_INTERVAL", "0")
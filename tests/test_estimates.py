@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from estimates import EstimateEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return EstimateEngine(pd.read_csv(os.path.join(ROOT, "timeline-estimates.csv")))
+
+
+def test_names_sharing_one_word_do_not_match(engine):
+    assert engine.lookup_hours(["Doctor profile", "Cart summary"]) == [None, None]
+
+
+def test_exact_and_close_names_match(engine):
+    hours = engine.lookup_hours(["Numeric pagination", "numeric pagination page"])
+    assert hours[0] is not None and hours[1] == hours[0]
+
+
+def test_category_limits_fuzzy_matches(engine):
+    assert engine.infer_category(["Numeric pagination", "google", "order summary"]) == "E-Commerce"
+    assert engine.lookup_hours(["numeric pagination page"], category="LMS") == [None]
@@ -0,0 +1,57 @@
+import os
+import time
+
+import app
+from exports import ExportQueue, MARKDOWN, proposal_title, render_pdf
+
+PROPOSAL = """## 1. Title
+MediCart Hub
+
+## 5. Major Features and Sub-Features
+
+| Main Feature | Sub-Feature | Complexity |
+|---|---|---|
+| Shopping Cart <sup>recommended</sup> | - **Cart management** | Medium |
+"""
+
+
+def wait_for(queue, export_id):
+    for _ in range(200):
+        status, error = queue.status(export_id)
+        if status != "pending":
+            return status, error
+        time.sleep(0.01)
+    return queue.status(export_id)
+
+
+def test_renders_feature_tables(tmp_path):
+    queue = ExportQueue(str(tmp_path))
+    key = queue.submit(PROPOSAL)
+    assert wait_for(queue, key) == ("done", None)
+    page = (tmp_path / f"{key}.html").read_text()
+    assert "<title>MediCart Hub</title>" in page and "<sup>recommended</sup>" in page
+    assert (tmp_path / f"{key}.pdf").read_bytes().startswith(b"%PDF")
+    assert proposal_title(MARKDOWN.parse(PROPOSAL)) == "MediCart Hub"
+    assert render_pdf(MARKDOWN.parse("# ₹ — café"), "t").startswith(b"%PDF")
+
+
+def test_cleanup_removes_expired_and_least_recently_used_exports(tmp_path):
+    queue = ExportQueue(str(tmp_path), ttl=3600, max_exports=2)
+    keys = []
+    for index in range(3):
+        keys.append(queue.submit(f"{PROPOSAL}\nVersion {index}"))
+        assert wait_for(queue, keys[-1])[0] == "done"
+    # The oldest export was evicted when the third one was rendered
+    assert [queue.is_done(key) for key in keys] == [False, True, True]
+    hour_ago = time.time() - 3601
+    os.utime(queue.path(keys[1], "pdf"), (hour_ago, hour_ago))
+    queue.touch(keys[2])
+    queue.cleanup()
+    assert [queue.is_done(key) for key in keys] == [False, False, True]
+    assert sorted(os.listdir(tmp_path)) == [f"{keys[2]}.html", f"{keys[2]}.pdf"]
+
+
+def test_oversized_exports_are_rejected():
+    client = app.app.test_client()
+    response = client.post('/api/export', json={"proposal": "x" * (app.EXPORT_MAX_BYTES + 1)})
+    assert response.status_code == 413
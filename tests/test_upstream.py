@@ -0,0 +1,298 @@
+"""
+Checks the rate limiter, retries and call coalescing of upstream.py against a local stub provider
+that answers 429 once its quota is used up.
+"""
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import app
+import asgi
+from llm_backends import GuardedChatModel, ReplayChatModel
+from upstream import LeaderAbandonedError, RateLimiter, RetryPolicy, SingleFlight
+
+EXTRACTION_RESPONSE = (
+    '{"What is the project to build?": "Online pharmacy", '
+    '"What are the features to add in the project?": "Shopping cart, Secure payments", '
+    '"What are the additional features that you want to add?": "Not provided"}'
+)
+MESSAGES = [HumanMessage(content="Extract the project details from: an online pharmacy")]
+
+
+class SimulatedRateLimitError(Exception):
+    """
+    The error the stub raises, shaped like the provider clients' 429 errors.
+    """
+
+    code = 429
+
+    def __init__(self, retry_after):
+        super().__init__(f"429 Resource has been exhausted (e.g. check quota). Retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class QuotaStubChatModel(ReplayChatModel):
+    """
+    A replay model accepting `quota` calls per `window` seconds and answering 429 beyond that.
+    """
+
+    default_response: str = EXTRACTION_RESPONSE
+    quota: int = 10
+    window: float = 1.0
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        object.__setattr__(self, "_state", {"window": None, "used": 0, "calls": 0, "rejected": 0})
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def calls(self):
+        return self._state["calls"]
+
+    @property
+    def rejected(self):
+        return self._state["rejected"]
+
+    def admit(self):
+        with self._lock:
+            now = time.monotonic()
+            window = int(now / self.window)
+            state = self._state
+            state["calls"] += 1
+            if state["window"] != window:
+                state["window"], state["used"] = window, 0
+            state["used"] += 1
+            if state["used"] > self.quota:
+                state["rejected"] += 1
+                raise SimulatedRateLimitError((window + 1) * self.window - now)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.admit()
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.admit()
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.admit()
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.admit()
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
+
+
+def guard(stub, limiter=None, retries=6):
+    return GuardedChatModel(
+        inner=stub,
+        limiter=limiter,
+        retry=RetryPolicy(max_retries=retries, base_delay=0.01, max_delay=0.5),
+        single_flight=SingleFlight(),
+    )
+
+
+@pytest.fixture
+def use_llm():
+    previous = app.llm
+
+    def install(model):
+        app.llm = model
+        return model
+    yield install
+    app.llm = previous
+
+
+def extract(client, index):
+    return client.post('/api/extract', json={"user_input": f"Draft {index}: an online pharmacy", "no_cache": True})
+
+
+def test_backoff_grows_and_honours_retry_after():
+    policy = RetryPolicy(max_retries=3, base_delay=0.1, max_delay=1.0)
+    assert all(0 <= policy.delay(attempt, Exception()) <= min(1.0, 0.1 * 2 ** attempt) for attempt in range(6))
+    assert policy.delay(0, SimulatedRateLimitError(0.7)) >= 0.7
+    assert policy.should_retry(2, SimulatedRateLimitError(0)) and not policy.should_retry(3, SimulatedRateLimitError(0))
+    assert not policy.should_retry(0, ValueError("bad prompt"))
+
+
+def test_retries_rate_limited_calls(use_llm):
+    stub = QuotaStubChatModel(quota=2, window=0.2)
+    use_llm(guard(stub))
+    client = app.app.test_client()
+    statuses = [extract(client, index).status_code for index in range(6)]
+    assert statuses == [200] * 6
+    assert stub.rejected > 0
+
+
+def test_limiter_keeps_calls_within_quota(use_llm):
+    stub = QuotaStubChatModel(quota=4, window=0.2)
+    use_llm(guard(stub, limiter=RateLimiter(rpm=4 * 60 / 0.2, burst_seconds=0.2)))
+    client = app.app.test_client()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        statuses = list(executor.map(lambda index: extract(client, index).status_code, range(12)))
+    assert statuses == [200] * 12
+
+
+def test_unguarded_calls_fail(use_llm):
+    stub = use_llm(QuotaStubChatModel(quota=0))
+    assert extract(app.app.test_client(), 0).status_code == 500
+    assert stub.rejected == 1
+
+
+def test_exhausted_retries_answer_503_with_retry_after(use_llm):
+    stub = QuotaStubChatModel(quota=0)
+    use_llm(guard(stub, retries=2))
+    response = extract(app.app.test_client(), 0)
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert stub.calls == 3
+
+
+def test_exhausted_retries_answer_503_on_the_async_path(use_llm):
+    use_llm(guard(QuotaStubChatModel(quota=0), retries=1))
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"user_input": "an online pharmacy", "no_cache": true}'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/api/extract", "method": "POST", "headers": []}
+    asyncio.run(asgi.application(scope, receive, send))
+    assert sent[0]["status"] == 503
+    assert int(dict(sent[0]["headers"])[b"retry-after"]) >= 1
+
+
+def test_identical_concurrent_calls_are_coalesced():
+    stub = QuotaStubChatModel(quota=10 ** 6, latency=0.2)
+    model = guard(stub)
+    duplicates = 10
+
+    def threaded(function):
+        barrier = threading.Barrier(duplicates)
+
+        def call(_):
+            barrier.wait()
+            return function()
+        with ThreadPoolExecutor(max_workers=duplicates) as executor:
+            return list(executor.map(call, range(duplicates)))
+
+    async def gathered(function):
+        return await asyncio.gather(*(function() for _ in range(duplicates)))
+
+    async def astream():
+        return [chunk async for chunk in model.astream(MESSAGES)]
+
+    for run in (
+        lambda: threaded(lambda: model.invoke(MESSAGES)),
+        lambda: threaded(lambda: list(model.stream(MESSAGES))),
+        lambda: asyncio.run(gathered(lambda: model.ainvoke(MESSAGES))),
+        lambda: asyncio.run(gathered(astream)),
+    ):
+        before = stub.calls
+        results = run()
+        assert stub.calls - before == 1
+        assert len(results) == duplicates
+
+
+def counting(chunks, delay, calls):
+    def function():
+        calls.append(1)
+        for chunk in range(chunks):
+            time.sleep(delay)
+            yield chunk
+    return function
+
+
+def test_abandoned_stream_fails_followers_with_partial_output():
+    single_flight = SingleFlight()
+    calls = []
+    leader = single_flight.stream("key", counting(10, 0.02, calls))
+    assert [next(leader) for _ in range(3)] == [0, 1, 2]
+    received, errors = [], []
+
+    def follow():
+        try:
+            for chunk in single_flight.stream("key", counting(10, 0.02, calls)):
+                received.append(chunk)
+        except LeaderAbandonedError as e:
+            errors.append(e)
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    time.sleep(0.01)
+    leader.close()
+    follower.join()
+    assert received == [0, 1, 2]
+    assert len(errors) == 1
+    assert len(calls) == 1
+
+
+def test_cancelled_async_leader_hands_the_call_on():
+    async def run():
+        single_flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(single_flight.ado("key", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(single_flight.ado("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, len(calls)
+
+    assert asyncio.run(run()) == ("done", 2)
+
+
+def run_timed_out_stream_leader(first_delay):
+    """
+    Streams ten chunks to a leader that times out after 0.05s and to a follower joining at once;
+    returns the follower's chunks, or the error it got, and the number of upstream calls.
+    """
+    async def run():
+        single_flight = SingleFlight()
+        calls = []
+
+        async def chunks():
+            calls.append(1)
+            await asyncio.sleep(first_delay)
+            for chunk in range(10):
+                yield chunk
+                await asyncio.sleep(0.02)
+
+        async def consume():
+            return [chunk async for chunk in single_flight.astream("key", chunks)]
+
+        leader = asyncio.ensure_future(asyncio.wait_for(consume(), 0.05))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(consume())
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        try:
+            return await follower, len(calls)
+        except LeaderAbandonedError as e:
+            return e, len(calls)
+
+    return asyncio.run(run())
+
+
+def test_timed_out_async_stream_leader_fails_followers_with_partial_output():
+    result, calls = run_timed_out_stream_leader(first_delay=0.0)
+    assert isinstance(result, LeaderAbandonedError)
+    assert calls == 1
+
+
+def test_timed_out_async_stream_leader_is_rerun_for_waiting_followers():
+    result, calls = run_timed_out_stream_leader(first_delay=0.1)
+    assert result == list(range(10))
+    assert calls == 2
@@ -0,0 +1,135 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from metrics import observe_stage
+
+_current_trace = contextvars.ContextVar('pipeline_trace', default=None)
+_current_stage = contextvars.ContextVar('pipeline_stage', default=None)
+
+
+class PipelineTrace:
+    """
+    Records the stages a single request went through: how long each took, whether it made an
+    LLM round-trip (with its estimated prompt and completion tokens and retries) and whether it
+    was answered from the response cache.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, name, duration, llm=False, cache_hit=False, prompt_tokens=0, completion_tokens=0, retries=0):
+        with self._lock:
+            self.stages.append({
+                "name": name, "duration": duration, "llm": llm, "cache_hit": cache_hit,
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "retries": retries,
+            })
+            if llm:
+                self.llm_calls += 1
+            if cache_hit:
+                self.cache_hits += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.retries += retries
+
+    def server_timing(self):
+        """
+        Returns the stages formatted as a `Server-Timing` header value.
+        """
+        with self._lock:
+            return ", ".join(
+                f"{stage['name']};dur={stage['duration'] * 1000:.1f}"
+                + (';desc="cache"' if stage['cache_hit'] else '')
+                for stage in self.stages
+            )
+
+    def summary(self):
+        """
+        Returns the recorded stages and counters as a dictionary.
+        """
+        with self._lock:
+            return {
+                "total": time.perf_counter() - self.started,
+                "llm_calls": self.llm_calls,
+                "cache_hits": self.cache_hits,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "retries": self.retries,
+                "stages": list(self.stages),
+            }
+
+
+def start_trace():
+    """
+    Starts a new trace for the current request and returns it.
+    """
+    trace = PipelineTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    """
+    Returns the trace of the current request, or None outside of a traced request.
+    """
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name, llm=False):
+    """
+    Times the enclosed block as stage `name` of the current trace and records it in the metrics.
+    Token counts and retries reported inside the block with `record_tokens` and `record_retry`
+    are attached to the stage.
+    """
+    details = {"prompt_tokens": 0, "completion_tokens": 0, "retries": 0}
+    parent = _current_stage.get()
+    _current_stage.set(details)
+    started = time.perf_counter()
+    try:
+        yield details
+    finally:
+        duration = time.perf_counter() - started
+        # Restored by value rather than by token, since streaming stages span generator resumptions
+        _current_stage.set(parent)
+        observe_stage(name, duration, llm=llm, **details)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(name, duration, llm=llm, **details)
+
+
+def record_tokens(prompt_tokens=0, completion_tokens=0):
+    """
+    Adds token counts to the stage currently running.
+    """
+    details = _current_stage.get()
+    if details is not None:
+        details["prompt_tokens"] += prompt_tokens
+        details["completion_tokens"] += completion_tokens
+
+
+def record_retry():
+    """
+    Counts a retried LLM call in the stage currently running.
+    """
+    details = _current_stage.get()
+    if details is not None:
+        details["retries"] += 1
+
+
+def record_cache_hit(name):
+    """
+    Records that stage `name` of the current trace was served from the response cache.
+    """
+    observe_stage(name, 0.0, cache_hit=True)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(name, 0.0, cache_hit=True)
@@ -0,0 +1,426 @@
+"""
+Client-side protection for the upstream LLM provider.
+
+`llm_backends.GuardedChatModel` wraps the shared chat model (see app.get_llm) with the pieces in
+this module, in front of every call, sync or async, invoked or streamed:
+
+- single-flight: identical prompts that are already in flight are not sent again; the later callers
+  wait for the running call and get its result (or replay its stream);
+- a token-bucket rate limiter sized from the provider quota in requests and estimated prompt tokens
+  per minute (LLM_RPM, LLM_TPM), so that bursts are smoothed out here instead of being rejected;
+- retries with exponential backoff and full jitter for rate-limit, quota and server errors. When the
+  retries are exhausted `UpstreamBusyError` is raised, which the web layers turn into a 503 with
+  Retry-After.
+
+A streamed call is only retried while it has not produced any output.
+
+Only a call that runs to completion (or raises) settles its coalesced callers. When the caller
+running it goes away first (a closed stream, a cancelled task, an early break), the callers that
+have not received anything yet start the call again and the others fail with
+`LeaderAbandonedError` instead of seeing a truncated result.
+"""
+import math
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from metrics import observe_coalesced, observe_rate_limit_wait
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "BadGateway", "GatewayTimeout", "DeadlineExceeded", "RateLimitError",
+}
+RETRYABLE_MESSAGES = ("429", "rate limit", "quota", "resource exhausted", "overloaded", "temporarily unavailable")
+
+
+class UpstreamBusyError(RuntimeError):
+    """
+    Raised when the LLM provider keeps rejecting a call after every retry.
+
+    Parameters:
+        retry_after (int): Seconds the client should wait before trying again.
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LeaderAbandonedError(RuntimeError):
+    """
+    Raised to a coalesced caller when the call it was sharing stopped before it finished.
+    """
+
+
+def abandoned():
+    return LeaderAbandonedError("The shared LLM call was abandoned before it finished")
+
+
+def status_code(error):
+    """
+    Returns the HTTP status carried by an exception from a provider client, if any.
+    """
+    for value in (
+        getattr(error, "code", None),
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_retryable(error):
+    """
+    Returns True for errors worth retrying: rate limits, exhausted quotas, timeouts and 5xx errors.
+    """
+    if isinstance(error, UpstreamBusyError):
+        return False
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    message = str(error).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+
+def retry_after(error):
+    """
+    Returns the delay in seconds the provider asked for with an error, or None.
+    """
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def find_upstream_busy(error):
+    """
+    Returns the UpstreamBusyError that caused `error` (or is `error`), or None.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, UpstreamBusyError):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class TokenBucket:
+    """
+    A token bucket refilled at `per_minute` tokens per minute and holding at most `capacity`
+    (by default one minute's worth).
+
+    `reserve` takes the tokens straight away, letting the balance go negative, and returns how long
+    the caller has to wait before using them; later callers queue up behind it. Nothing is held
+    while waiting, so the same bucket serves threads and coroutines.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity or per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single call larger than the bucket only has to wait for a full bucket
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Limits upstream calls to `rpm` requests and `tpm` estimated prompt tokens per minute;
+    0 leaves the respective limit off. Up to `burst_seconds` worth of either may be used at once.
+    """
+
+    def __init__(self, rpm=0, tpm=0, burst_seconds=60.0):
+        self.requests = TokenBucket(rpm, max(1.0, rpm * burst_seconds / 60)) if rpm else None
+        self.tokens = TokenBucket(tpm, max(1.0, tpm * burst_seconds / 60)) if tpm else None
+
+    def reserve(self, prompt_tokens):
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.reserve(prompt_tokens))
+        delay = max(delays)
+        if delay:
+            observe_rate_limit_wait(delay)
+        return delay
+
+    def acquire(self, prompt_tokens):
+        delay = self.reserve(prompt_tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self, prompt_tokens):
+        delay = self.reserve(prompt_tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: retry `n` waits a random time between 0 and
+    min(max_delay, base_delay * 2**n), or at least what the provider asked for with Retry-After.
+    """
+
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=20.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error):
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after(error) or 0.0)
+
+    def should_retry(self, attempt, error):
+        return attempt < self.max_retries and is_retryable(error)
+
+    def give_up(self, attempt, error):
+        """
+        Returns the error to raise for a call that is not retried any further.
+        """
+        if not is_retryable(error):
+            return error
+        wait = max(self.base_delay * 2 ** attempt, retry_after(error) or 0.0)
+        return UpstreamBusyError(
+            f"LLM provider unavailable after {attempt + 1} attempts: {error}",
+            retry_after=max(1, math.ceil(min(self.max_delay, wait))),
+        )
+
+
+class _SharedStream:
+    """
+    The chunks of a streamed call as the leader receives them, replayed to the callers coalesced
+    onto it.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def add(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    def replay(self):
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.chunks) and not self.done:
+                    self.condition.wait()
+                if index >= len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                chunk = self.chunks[index]
+            index += 1
+            yield chunk
+
+
+class _AsyncSharedStream:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+
+    def add(self, chunk):
+        self.chunks.append(chunk)
+        self.changed.set()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self.changed.set()
+
+    async def replay(self):
+        index = 0
+        while True:
+            while index >= len(self.chunks) and not self.done:
+                self.changed.clear()
+                await self.changed.wait()
+            if index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+            yield self.chunks[index]
+            index += 1
+
+
+class SingleFlight:
+    """
+    Tracks the calls in flight by key so that identical concurrent calls share one upstream call.
+
+    Threads and coroutines are tracked separately; coroutine calls are expected to run on one
+    event loop.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.async_calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key, factory):
+        with self._lock:
+            call = self.calls.get(key)
+            if call is not None:
+                observe_coalesced()
+                return call, False
+            call = self.calls[key] = factory()
+            return call, True
+
+    def _leave(self, key, call):
+        with self._lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+
+    def do(self, key, function):
+        """
+        Returns `function()`, or the result of the identical call already running.
+        """
+        while True:
+            call, leader = self._join(key, Future)
+            if leader:
+                break
+            try:
+                return call.result()
+            except LeaderAbandonedError:
+                # The leader went away without a result; run the call again
+                continue
+        try:
+            result = function()
+        except BaseException as e:
+            self._leave(key, call)
+            call.set_exception(e if isinstance(e, Exception) else abandoned())
+            raise
+        self._leave(key, call)
+        call.set_result(result)
+        return result
+
+    def stream(self, key, function):
+        """
+        Yields the items of `function()`, or replays those of the identical stream already running.
+
+        A caller joining a stream gets the items its leader reads. If the leader stops before the
+        stream ends, a caller that has not received anything yet runs the stream again, and one
+        that has fails with LeaderAbandonedError once it has replayed what the leader read.
+        """
+        while True:
+            shared, leader = self._join(key, _SharedStream)
+            if leader:
+                break
+            replayed = 0
+            try:
+                for chunk in shared.replay():
+                    replayed += 1
+                    yield chunk
+                return
+            except LeaderAbandonedError:
+                if replayed:
+                    raise
+        error = abandoned()
+        try:
+            for chunk in function():
+                shared.add(chunk)
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Leave first, so that callers restarting after an abandoned stream do not rejoin it
+            self._leave(key, shared)
+            shared.finish(error)
+
+    def _aleave(self, key, call):
+        if self.async_calls.get(key) is call:
+            del self.async_calls[key]
+
+    async def ado(self, key, function):
+        """
+        Async `do`; `function()` returns an awaitable.
+        """
+        while True:
+            call = self.async_calls.get(key)
+            if call is None:
+                break
+            observe_coalesced()
+            try:
+                # Shielded so that a caller timing out does not cancel the call it shares
+                return await asyncio.shield(call)
+            except LeaderAbandonedError:
+                # The leader was cancelled; run the call again
+                continue
+        call = self.async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await function()
+        except BaseException as e:
+            self._aleave(key, call)
+            # A cancelled leader hands the call on instead of cancelling the callers sharing it
+            call.set_exception(e if isinstance(e, Exception) else abandoned())
+            # Mark it retrieved for when nobody else was waiting
+            call.exception()
+            raise
+        self._aleave(key, call)
+        call.set_result(result)
+        return result
+
+    async def astream(self, key, function):
+        """
+        Async `stream`; `function()` returns an async iterator.
+        """
+        while True:
+            shared = self.async_calls.get(key)
+            if shared is None:
+                break
+            observe_coalesced()
+            replayed = 0
+            try:
+                async for chunk in shared.replay():
+                    replayed += 1
+                    yield chunk
+                return
+            except LeaderAbandonedError:
+                if replayed:
+                    raise
+        shared = self.async_calls[key] = _AsyncSharedStream()
+        error = abandoned()
+        try:
+            async for chunk in function():
+                shared.add(chunk)
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._aleave(key, shared)
+            shared.finish(error)